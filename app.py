@@ -1,71 +1,73 @@
+import argparse
 import csv
+import gzip
+import io
+import json
+import math
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from grading import TEN_POINT, get_scale
 
-def marks_to_grade_point(marks):
-    """Convert marks (0-100) to grade point (10-point scale)"""
-    if marks >= 90:
-        return 10
-    elif marks >= 80:
-        return 9
-    elif marks >= 70:
-        return 8
-    elif marks >= 60:
-        return 7
-    elif marks >= 50:
-        return 6
-    elif marks >= 40:
-        return 5
-    elif marks >= 30:
-        return 4
-    else:
-        return 0
+# Number of formatted rows collected before each write to the output stream
+WRITE_BATCH_SIZE = 1000
+
+def marks_to_grade_point(marks, scale=TEN_POINT):
+    """Convert marks (0-100) to a grade point on scale (default: 10-point)"""
+    return scale.grade_point(marks)
+
+def open_csv(csv_file):
+    """Open a CSV path for text reading; '-' is stdin and '.gz' files are decompressed"""
+    if csv_file == '-':
+        return io.TextIOWrapper(sys.stdin.buffer, newline='') if hasattr(sys.stdin, 'buffer') else sys.stdin
+    if csv_file.endswith('.gz'):
+        return gzip.open(csv_file, 'rt', newline='')
+    return open(csv_file, 'r', newline='')
+
+def calculate_cgpa(csv_file, quiet=False, scale=TEN_POINT, out=None, workers=1):
+    """Calculate CGPA from CSV file containing course data
 
-def calculate_cgpa(csv_file):
-    """Calculate CGPA from CSV file containing course data"""
+    Rows are streamed: only the running credit and grade point totals are
+    kept, so memory stays flat regardless of file size. With quiet=True the
+    per-row table is skipped and only the summary is printed; quiet runs can
+    also be split across several worker processes.
+    """
+    out = out or sys.stdout
     try:
         total_credits = 0
         weighted_grade_points = 0
-        courses = []
 
-        with open(csv_file, 'r') as file:
-            reader = csv.DictReader(file)
-
-            print("\n" + "="*90)
-            print(f"{'Course Name':<30} {'Subject Area':<20} {'Credits':<10} {'Marks':<10} {'Grade Point':<10}")
-            print("="*90)
+        if workers > 1 and quiet:
+            total_credits, weighted_grade_points = parallel_aggregate(
+                csv_file, ['Credits', 'Marks'], scale, workers)
+            return _write_summary(out, total_credits, weighted_grade_points)
 
-            for row in reader:
-                course_name = row['Course Name']
-                subject_area = row.get('Subject Area', 'N/A')
-                credits = float(row['Credits'])
-                marks = float(row['Marks'])
-
-                grade_point = marks_to_grade_point(marks)
+        with open_csv(csv_file) as file:
+            reader = csv.DictReader(file)
 
-                courses.append({
-                    'name': course_name,
-                    'subject': subject_area,
-                    'credits': credits,
-                    'marks': marks,
-                    'grade_point': grade_point
-                })
+            if not quiet:
+                out.write("\n" + "="*90 + "\n")
+                out.write(f"{'Course Name':<30} {'Subject Area':<20} {'Credits':<10} {'Marks':<10} {'Grade Point':<10}\n")
+                out.write("="*90 + "\n")
 
-                total_credits += credits
-                weighted_grade_points += (grade_point * credits)
+            for block in _blocks(reader):
+                credits = [float(row['Credits']) for row in block]
+                marks = [float(row['Marks']) for row in block]
+                block_credits, block_points = scale.weighted_totals(credits, marks)
+                total_credits += block_credits
+                weighted_grade_points += block_points
 
-                print(f"{course_name:<30} {subject_area:<20} {credits:<10.1f} {marks:<10.1f} {grade_point:<10.1f}")
+                if not quiet:
+                    out.write(''.join(
+                        f"{row['Course Name']:<30} {row.get('Subject Area', 'N/A'):<20} "
+                        f"{credit:<10.1f} {mark:<10.1f} {float(point):<10.1f}\n"
+                        for row, credit, mark, point in zip(block, credits, marks, scale.grade_points(marks))
+                    ))
 
-            print("="*90)
+            if not quiet:
+                out.write("="*90 + "\n")
 
-            if total_credits > 0:
-                cgpa = weighted_grade_points / total_credits
-                print(f"\nTotal Credits: {total_credits:.1f}")
-                print(f"CGPA: {cgpa:.2f}")
-                print("="*90 + "\n")
-                return cgpa
-            else:
-                print("\nError: No courses found or total credits is zero.")
-                return None
+            return _write_summary(out, total_credits, weighted_grade_points)
 
     except FileNotFoundError:
         print(f"\nError: File '{csv_file}' not found.")
@@ -75,17 +77,317 @@ def calculate_cgpa(csv_file):
         print(f"\nError: Missing required column {e} in CSV file.")
         print("CSV file must have columns: Course Name, Subject Area (optional), Credits, Marks")
         return None
-    except ValueError as e:
+    except (ValueError, IndexError, TypeError) as e:
+        # Short rows: DictReader fills in None, csv.reader rows (with --workers) are too short
         print(f"\nError: Invalid data in CSV file - {e}")
         print("Credits and Marks must be numeric values.")
         return None
 
+def _write_summary(out, total_credits, weighted_grade_points):
+    if total_credits > 0:
+        cgpa = weighted_grade_points / total_credits
+        out.write(f"\nTotal Credits: {total_credits:.1f}\n")
+        out.write(f"CGPA: {cgpa:.2f}\n")
+        out.write("="*90 + "\n\n")
+        return cgpa
+    else:
+        out.write("\nError: No courses found or total credits is zero.\n")
+        return None
+
+def _column_indexes(header, names):
+    """Positions of the named columns in a CSV header; KeyError names the missing one"""
+    positions = {name: i for i, name in enumerate(header)}
+    return [positions[name] for name in names]
+
+def _blocks(rows, size=WRITE_BATCH_SIZE):
+    """Lists of up to size rows, for the scale's batch (NumPy) grade point lookups.
+
+    Empty rows are dropped: csv.reader yields [] for a blank line, which
+    DictReader skips.
+    """
+    block = []
+    for row in rows:
+        if not row:
+            continue
+        block.append(row)
+        if len(block) >= size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def aggregate_groups(rows, indexes, scale=TEN_POINT):
+    """Hash-aggregate rows into {(student_id, semester): [credits, weighted_grade_points]}
+
+    Keys keep the order in which each (student, semester) was first seen.
+    """
+    student_col, semester_col, credits_col, marks_col = indexes
+    groups = {}
+
+    for block in _blocks(rows):
+        credits = [float(row[credits_col]) for row in block]
+        points = scale.grade_points([float(row[marks_col]) for row in block])
+        for row, credit, point in zip(block, credits, points):
+            key = (row[student_col], row[semester_col])
+            weighted = float(point) * credit
+            totals = groups.get(key)
+            if totals is None:
+                groups[key] = [credit, weighted]
+            else:
+                totals[0] += credit
+                totals[1] += weighted
+
+    return groups
+
+def aggregate_totals(rows, indexes, scale=TEN_POINT):
+    """[credits, weighted_grade_points] over all rows"""
+    credits_col, marks_col = indexes
+    total_credits = 0
+    weighted_grade_points = 0
+
+    for block in _blocks(rows):
+        block_credits, block_points = scale.weighted_totals([float(row[credits_col]) for row in block],
+                                                            [float(row[marks_col]) for row in block])
+        total_credits += block_credits
+        weighted_grade_points += block_points
+
+    return [total_credits, weighted_grade_points]
+
+def chunk_ranges(csv_file, chunks):
+    """Split a CSV file's data rows into up to `chunks` (start, end) byte ranges.
+
+    Boundaries are moved forward to the next line start. Quoted fields with
+    embedded newlines are not supported in chunked mode.
+    """
+    size = os.path.getsize(csv_file)
+    with open(csv_file, 'rb') as file:
+        file.readline()
+        data_start = file.tell()
+        boundaries = [data_start]
+        for i in range(1, chunks):
+            file.seek(max(data_start + (size - data_start) * i // chunks - 1, boundaries[-1]))
+            file.readline()
+            if file.tell() < size and file.tell() > boundaries[-1]:
+                boundaries.append(file.tell())
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def _read_range(csv_file, start, end):
+    """Decoded lines of csv_file that start within [start, end)"""
+    with open(csv_file, 'rb') as file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            line = file.readline()
+            if not line:
+                break
+            remaining -= len(line)
+            yield line.decode('utf-8')
+
+def _aggregate_chunk(csv_file, start, end, indexes, scale):
+    rows = csv.reader(_read_range(csv_file, start, end))
+    if len(indexes) == 4:
+        return aggregate_groups(rows, indexes, scale)
+    return aggregate_totals(rows, indexes, scale)
+
+def parallel_aggregate(csv_file, columns, scale=TEN_POINT, workers=None):
+    """Aggregate a CSV file across worker processes and merge the partial results.
+
+    With Student ID/Semester/Credits/Marks columns this returns the same
+    {(student_id, semester): [credits, points]} mapping as aggregate_groups,
+    in the same first-seen order; with Credits/Marks it returns the overall
+    [credits, points]. Partial results are merged in file order.
+    """
+    if csv_file == '-' or csv_file.endswith('.gz'):
+        raise ValueError('--workers needs a plain, uncompressed CSV file')
+
+    with open_csv(csv_file) as file:
+        indexes = _column_indexes(next(csv.reader(file), []), columns)
+
+    workers = workers or os.cpu_count()
+    ranges = chunk_ranges(csv_file, workers)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_aggregate_chunk, csv_file, start, end, indexes, scale)
+                   for start, end in ranges]
+        partials = [future.result() for future in futures]
+
+    if len(columns) != 4:
+        return [sum(partial[0] for partial in partials), sum(partial[1] for partial in partials)]
+
+    merged = {}
+    for partial in partials:
+        for key, (credits, points) in partial.items():
+            totals = merged.get(key)
+            if totals is None:
+                merged[key] = [credits, points]
+            else:
+                totals[0] += credits
+                totals[1] += points
+    return merged
+
+def iter_students(groups):
+    """Yield (student_id, {semester: [credits, points]}) from aggregate_groups output"""
+    students = {}
+    for (student_id, semester), totals in groups.items():
+        students.setdefault(student_id, {})[semester] = totals
+    yield from students.items()
+
+def iter_sorted_students(rows, indexes, scale=TEN_POINT):
+    """Yield one student at a time from rows already sorted by student id.
+
+    Only the current student's semesters are held in memory.
+    """
+    student_col = indexes[0]
+    current = None
+    batch = []
+
+    for row in rows:
+        if not row:
+            continue
+        if row[student_col] != current:
+            if batch:
+                yield current, {semester: totals for (_, semester), totals in aggregate_groups(batch, indexes, scale).items()}
+            current = row[student_col]
+            batch = []
+        batch.append(row)
+
+    if batch:
+        yield current, {semester: totals for (_, semester), totals in aggregate_groups(batch, indexes, scale).items()}
+
+def summarize_student(semesters):
+    """([(semester, credits, gpa), ...], total_credits, cgpa) for one student.
+
+    Matches the web app: each semester GPA is rounded before it is weighted
+    by the semester's credits.
+    """
+    rows = []
+    weighted = []
+
+    for semester, (credits, points) in semesters.items():
+        gpa = round(points / credits, 2) if credits else 0.0
+        rows.append((semester, credits, gpa))
+        if credits > 0:
+            weighted.append((credits, gpa * credits))
+
+    # fsum keeps the result independent of the order semesters were seen in
+    total_credits = math.fsum(credits for credits, _ in weighted)
+    weighted_gpa = math.fsum(points for _, points in weighted)
+    cgpa = round(weighted_gpa / total_credits, 2) if total_credits else 0.0
+    return rows, total_credits, cgpa
+
+def write_student_results(students, out, fmt='csv'):
+    """Write per-semester GPA and overall CGPA for each student; returns the student count"""
+    count = 0
+    pending = []
+    writer = csv.writer(out, lineterminator='\n')
+
+    def flush():
+        if fmt == 'csv':
+            writer.writerows(pending)
+        else:
+            out.write(''.join(pending))
+        pending.clear()
+
+    if fmt == 'csv':
+        writer.writerow(['Student ID', 'Semester', 'Credits', 'GPA', 'CGPA'])
+
+    for student_id, semesters in students:
+        rows, total_credits, cgpa = summarize_student(semesters)
+        if fmt == 'csv':
+            pending.extend([student_id, semester, f'{credits:g}', f'{gpa:.2f}', f'{cgpa:.2f}']
+                           for semester, credits, gpa in rows)
+        else:
+            pending.append(json.dumps({
+                'student_id': student_id,
+                'semesters': [{'semester': semester, 'credits': credits, 'gpa': gpa}
+                              for semester, credits, gpa in rows],
+                'total_credits': total_credits,
+                'cgpa': cgpa,
+            }) + '\n')
+
+        count += 1
+        if len(pending) >= WRITE_BATCH_SIZE:
+            flush()
+
+    flush()
+    return count
+
+def calculate_grouped_cgpa(csv_file, out=None, fmt='csv', presorted=False, scale=TEN_POINT, workers=1):
+    """Calculate per-semester GPA and overall CGPA for every student in a CSV file
+
+    The file needs Student ID and Semester columns in addition to Credits and
+    Marks. Rows are hash-aggregated in one pass; with presorted=True rows must
+    be grouped by Student ID and are streamed one student at a time instead.
+    With workers > 1 the file is aggregated in parallel chunks.
+    Returns the number of students written, or None on error.
+    """
+    out = out or sys.stdout
+    try:
+        if workers > 1:
+            groups = parallel_aggregate(csv_file, ['Student ID', 'Semester', 'Credits', 'Marks'], scale, workers)
+            return write_student_results(iter_students(groups), out, fmt)
+
+        with open_csv(csv_file) as file:
+            reader = csv.reader(file)
+            indexes = _column_indexes(next(reader, []), ['Student ID', 'Semester', 'Credits', 'Marks'])
+
+            if presorted:
+                students = iter_sorted_students(reader, indexes, scale)
+            else:
+                students = iter_students(aggregate_groups(reader, indexes, scale))
+            return write_student_results(students, out, fmt)
+
+    except FileNotFoundError:
+        print(f"\nError: File '{csv_file}' not found.", file=sys.stderr)
+        return None
+    except KeyError as e:
+        print(f"\nError: Missing required column {e} in CSV file.", file=sys.stderr)
+        print("Grouped mode needs columns: Student ID, Semester, Credits, Marks", file=sys.stderr)
+        return None
+    except (ValueError, IndexError) as e:
+        print(f"\nError: Invalid data in CSV file - {e}", file=sys.stderr)
+        print("Credits and Marks must be numeric values.", file=sys.stderr)
+        return None
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Calculate CGPA from a CSV file of courses.')
+    parser.add_argument('csv_file', nargs='?', default='courses.csv',
+                        help="CSV file to read ('-' for stdin, '.gz' files are decompressed)")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='only print the summary, not one line per course')
+    parser.add_argument('--scale', default='10-point',
+                        help="grading scale name ('10-point', '4.0') or path to a JSON scale file")
+    parser.add_argument('--group', action='store_true',
+                        help='per-student/per-semester results from Student ID and Semester columns')
+    parser.add_argument('--presorted', action='store_true',
+                        help='with --group: input is sorted by Student ID, stream one student at a time')
+    parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv',
+                        help='with --group: output format (default: csv)')
+    parser.add_argument('-o', '--output', help='with --group: write results to this file instead of stdout')
+    parser.add_argument('-w', '--workers', type=int, default=1,
+                        help='aggregate with N worker processes (needs --quiet or --group and a plain CSV file)')
+    args = parser.parse_args(argv)
+    if args.workers > 1:
+        if not (args.quiet or args.group):
+            parser.error('--workers needs --quiet or --group; the per-course table is written sequentially')
+        if args.csv_file == '-' or args.csv_file.endswith('.gz'):
+            parser.error('--workers needs a plain, uncompressed CSV file')
+    return args
+
 if __name__ == "__main__":
-    csv_file = "courses.csv"
+    args = parse_args()
+    scale = get_scale(args.scale)
 
-    if len(sys.argv) > 1:
-        csv_file = sys.argv[1]
+    if args.group:
+        if args.output:
+            with open(args.output, 'w', newline='') as output:
+                result = calculate_grouped_cgpa(args.csv_file, output, args.format, args.presorted, scale, args.workers)
+        else:
+            result = calculate_grouped_cgpa(args.csv_file, None, args.format, args.presorted, scale, args.workers)
+        sys.exit(0 if result is not None else 1)
 
-    print("\n*** CGPA Calculator (10-Point Scale) ***")
-    print(f"Reading from: {csv_file}\n")
-    calculate_cgpa(csv_file)
+    print(f"\n*** CGPA Calculator ({scale.name.title()} Scale) ***")
+    print(f"Reading from: {args.csv_file}\n")
+    sys.stdout.flush()
+    calculate_cgpa(args.csv_file, quiet=args.quiet, scale=scale, workers=args.workers)
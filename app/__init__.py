@@ -1,8 +1,20 @@
 from flask import Flask
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from config import config
-from app.models import db, User
+from grading import get_scale
+from app.models import db
+from app.loaders import load_user as load_cached_user
+from app.cache import gpa_cache, user_cache
+from app.instrumentation import instrumentation
+from app.routing import replicas
+from app.auth.login import login_throttle, last_logins
+from app.fragments import fragment_cache
+from app.http_cache import static_assets
+from app.jobs import jobs
+from app.analytics import analytics
+from app.summary import gpa_summary
 
 login_manager = LoginManager()
 migrate = Migrate()
@@ -10,19 +22,40 @@ migrate = Migrate()
 def create_app(config_name='default'):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    if app.config['PROXY_FIX_X_FOR']:
+        # request.remote_addr is the client's IP rather than the proxy's
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
     # Initialize extensions
     db.init_app(app)
+    replicas.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
+    gpa_cache.init_app(app)
+    user_cache.init_app(app)
+    fragment_cache.init_app(app)
+    static_assets.init_app(app)
+    instrumentation.init_app(app)
+    login_throttle.init_app(app)
+    last_logins.init_app(app)
+    jobs.init_app(app)
+    analytics.init_app(app)
+    gpa_summary.init_app(app)
+    app.extensions['grading_scale'] = get_scale(app.config['GRADING_SCALE'])
 
     # Configure login manager
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
+    # API clients get a 401 instead of a redirect to the login page
+    login_manager.blueprint_login_views = {'api': None}
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(int(user_id))
+
+    @app.context_processor
+    def inject_grading_scale():
+        return {'grading_scale': app.extensions['grading_scale']}
 
     # Register blueprints
     from app.auth import auth as auth_blueprint
@@ -31,4 +64,14 @@ def create_app(config_name='default'):
     from app.main import main as main_blueprint
     app.register_blueprint(main_blueprint)
 
+    from app.api import api as api_blueprint
+    app.register_blueprint(api_blueprint, url_prefix='/api/v1')
+
+    # Register background job tasks
+    from app import tasks  # noqa: F401
+
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+
     return app
@@ -0,0 +1,201 @@
+import math
+from sqlalchemy import Float, Integer, case, cast, func, select
+from app.cache import TTLCache
+from app.models import db, Student, Semester, Course
+from app.utils import get_grading_scale, grade_point_expression
+
+# Percentiles reported for each cohort
+PERCENTILES = (25, 50, 75, 90)
+
+
+class CohortAnalytics:
+    """CGPA rankings, percentiles and distributions for cohorts of a user's students.
+
+    A cohort is the students of one program and/or year, or the students
+    with courses in one subject area. Everything is computed in one SQL
+    query per call with window functions: program/year cohorts read the
+    stored CGPA totals, and subject cohorts aggregate grade points per
+    student over that subject's courses. Results are cached per user and
+    cohort under a version stamp of the user's students, so any write shows
+    up on the next call.
+    """
+
+    def __init__(self):
+        self.store = TTLCache(maxsize=256, ttl=600)
+
+    def init_app(self, app):
+        self.store = TTLCache(maxsize=app.config.get('ANALYTICS_CACHE_SIZE', 256),
+                              ttl=app.config.get('ANALYTICS_CACHE_TTL', 600))
+
+    def _cached(self, user_id, key, compute):
+        key = (user_id, get_grading_scale().name, _version(user_id)) + key
+        value = self.store.get(key)
+        if value is None:
+            value = compute()
+            self.store.set(key, value)
+        return value
+
+    def cohorts(self, user_id, group_by=('program', 'year')):
+        """Size, mean, min/max and percentiles of CGPA per program and/or year"""
+        return self._cached(user_id, ('cohorts', tuple(group_by)),
+                            lambda: _summary(_student_cgpas(user_id).subquery(), group_by))
+
+    def subjects(self, user_id):
+        """Size, mean, min/max and percentiles of subject GPA per subject area"""
+        return self._cached(user_id, ('subjects',),
+                            lambda: _summary(_subject_gpas(user_id).subquery(), ('subject_area',)))
+
+    def rankings(self, user_id, program=None, year=None, subject_area=None, top=None, limit=100, offset=0):
+        """Students of one cohort by rank; top=10 keeps the top 10%"""
+        def compute():
+            if subject_area is not None:
+                base = _subject_gpas(user_id, subject_area)
+            else:
+                base = _student_cgpas(user_id, program, year)
+            return _rankings(base.subquery(), top, limit, offset)
+        return self._cached(user_id, ('rankings', program, year, subject_area, top, limit, offset), compute)
+
+    def distribution(self, user_id, program=None, year=None, subject_area=None, bucket_width=0.5):
+        """Histogram of CGPA (or subject GPA) in buckets of bucket_width grade points"""
+        def compute():
+            if subject_area is not None:
+                base = _subject_gpas(user_id, subject_area)
+            else:
+                base = _student_cgpas(user_id, program, year)
+            return _distribution(base.subquery(), bucket_width)
+        return self._cached(user_id, ('distribution', program, year, subject_area, bucket_width), compute)
+
+
+def _version(user_id):
+    # Student and child writes move updated_at and data_version; deletes move the count
+    return tuple(db.session.execute(
+        select(func.count(Student.id), func.max(Student.updated_at), func.sum(Student.data_version))
+        .where(Student.user_id == user_id)
+    ).one())
+
+
+def _ratio(points, credits):
+    """points / credits as a float, 0 without credits.
+
+    Both sides are cast to float first: SQLite stores whole numbers in
+    NUMERIC columns as integers and would divide them as integers. Ranks
+    use the exact ratio; values are rounded in Python like gpa_from_totals,
+    since SQL rounds halves differently.
+    """
+    return func.coalesce(cast(points, Float) / func.nullif(cast(credits, Float), 0), 0)
+
+
+def _student_cgpas(user_id, program=None, year=None):
+    query = select(Student.id, Student.student_id, Student.name, Student.program, Student.year,
+                   _ratio(Student.weighted_points, Student.total_credits).label('gpa')) \
+        .where(Student.user_id == user_id)
+    if program is not None:
+        query = query.where(Student.program == program)
+    if year is not None:
+        query = query.where(Student.year == year)
+    return query
+
+
+def _subject_gpas(user_id, subject_area=None):
+    credits = func.sum(Course.credits)
+    points = func.sum(grade_point_expression(Course.marks) * Course.credits)
+    query = select(Student.id, Student.student_id, Student.name, Student.program, Student.year,
+                   Course.subject_area, _ratio(points, credits).label('gpa')) \
+        .select_from(Student) \
+        .join(Semester, Semester.student_id == Student.id) \
+        .join(Course, Course.semester_id == Semester.id) \
+        .where(Student.user_id == user_id, Course.subject_area.is_not(None)) \
+        .group_by(Student.id, Student.student_id, Student.name, Student.program, Student.year,
+                  Course.subject_area)
+    if subject_area is not None:
+        query = query.where(Course.subject_area == subject_area)
+    return query
+
+
+def _floor(value):
+    # PostgreSQL rounds when casting to integer; SQLite truncates (floor for GPAs >= 0)
+    if db.session.get_bind().dialect.name == 'sqlite':
+        return cast(value, Integer)
+    return cast(func.floor(value), Integer)
+
+
+def _summary(base, group_by):
+    groups = [base.c[column] for column in group_by]
+    percentile = func.percent_rank(type_=Float).over(partition_by=groups, order_by=base.c.gpa)
+    ranked = select(*groups, base.c.gpa, percentile.label('percentile')).subquery()
+    ranked_groups = [ranked.c[column] for column in group_by]
+
+    # Nearest-rank percentiles: the lowest GPA at or above each percent_rank
+    # (a one-student cohort has percent_rank 0 throughout)
+    percentiles = [func.coalesce(func.min(case((ranked.c.percentile >= value / 100, ranked.c.gpa))),
+                                 func.max(ranked.c.gpa))
+                   for value in PERCENTILES]
+    query = select(*ranked_groups, func.count(), func.avg(ranked.c.gpa),
+                   func.min(ranked.c.gpa), func.max(ranked.c.gpa), *percentiles) \
+        .group_by(*ranked_groups).order_by(*ranked_groups)
+
+    rows = []
+    for row in db.session.execute(query):
+        values = dict(zip(group_by, row))
+        size, mean, minimum, maximum, *points = row[len(group_by):]
+        values.update({
+            'size': size,
+            'mean': round(mean, 2),
+            'min': round(minimum, 2),
+            'max': round(maximum, 2),
+            'percentiles': {str(value): round(point, 2) for value, point in zip(PERCENTILES, points)},
+        })
+        rows.append(values)
+    return rows
+
+
+def _rankings(base, top=None, limit=100, offset=0):
+    order = base.c.gpa.desc()
+    ranked = select(
+        base,
+        func.rank().over(order_by=order).label('rank'),
+        func.percent_rank(type_=Float).over(order_by=base.c.gpa).label('percentile'),
+        func.ntile(10).over(order_by=order).label('decile'),
+        func.count().over().label('cohort_size'),
+    ).subquery()
+
+    query = select(ranked).order_by(ranked.c.rank, ranked.c.student_id).limit(limit).offset(offset)
+    if top is not None:
+        # Students ranked above the cut-off, so a small cohort keeps at least its
+        # top student; students tied at the cut-off are all kept
+        query = query.where((ranked.c.rank - 1) * 100 < ranked.c.cohort_size * top)
+
+    rows = []
+    for row in db.session.execute(query).mappings():
+        rows.append({
+            'id': row['id'],
+            'student_id': row['student_id'],
+            'name': row['name'],
+            'program': row['program'],
+            'year': row['year'],
+            'gpa': round(row['gpa'], 2),
+            'rank': row['rank'],
+            'percentile': round(100 * float(row['percentile']), 1),
+            'decile': row['decile'],
+            'cohort_size': row['cohort_size'],
+        })
+    return rows
+
+
+def _distribution(base, bucket_width):
+    bucket = _floor(base.c.gpa / bucket_width).label('bucket')
+    max_point = get_grading_scale().max_point
+    histogram = [0] * max(math.ceil(max_point / bucket_width), 1)
+
+    # Every bucket from 0 to the top grade point, empty ones included; a
+    # perfect score counts in the last bucket
+    for index, count in db.session.execute(select(bucket, func.count()).group_by(bucket)):
+        histogram[min(index, len(histogram) - 1)] += count
+    return [
+        {'min': round(index * bucket_width, 2), 'max': round(min((index + 1) * bucket_width, max_point), 2),
+         'count': count}
+        for index, count in enumerate(histogram)
+    ]
+
+
+analytics = CohortAnalytics()
@@ -0,0 +1,656 @@
+import base64
+import hashlib
+from flask import jsonify, request, abort, url_for, current_app, g
+from flask_login import login_required, current_user
+from sqlalchemy import select, insert, update, delete
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+from werkzeug.exceptions import HTTPException
+from app.api import api
+from app.models import db, Student, Semester, Course, Job
+from app.main.forms import StudentForm, SemesterForm, CourseForm
+from app.cache import bump_data_version
+from app.utils import semester_aggregates, recompute_gpa_totals, get_grading_scale
+from app.loaders import owned_student_or_404, owned_semester_or_404, owned_course_or_404, owned_job_or_404
+from app.jobs import jobs
+from app.exporter import EXPORT_FORMATS
+from app.analytics import analytics
+
+
+# Serialization
+
+def serialize_student(student):
+    return {
+        'id': student.id,
+        'name': student.name,
+        'student_id': student.student_id,
+        'email': student.email,
+        'program': student.program,
+        'year': student.year,
+        'total_credits': float(student.total_credits),
+        'cgpa': student.overall_cgpa,
+        'updated_at': _isoformat(student.updated_at),
+    }
+
+
+def serialize_semester(semester, course_count=None):
+    return {
+        'id': semester.id,
+        'student_id': semester.student_id,
+        'name': semester.name,
+        'semester_number': semester.semester_number,
+        'year': semester.year,
+        'start_date': _isoformat(semester.start_date),
+        'end_date': _isoformat(semester.end_date),
+        'total_credits': float(semester.total_credits),
+        'gpa': semester.gpa,
+        'course_count': course_count,
+        'updated_at': _isoformat(semester.updated_at),
+    }
+
+
+def serialize_course(course):
+    return {
+        'id': course.id,
+        'semester_id': course.semester_id,
+        'course_name': course.course_name,
+        'subject_area': course.subject_area,
+        'course_code': course.course_code,
+        'credits': float(course.credits),
+        'marks': float(course.marks),
+        'grade_point': course.grade_point,
+        'updated_at': _isoformat(course.updated_at),
+    }
+
+
+def serialize_job(job):
+    data = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'total': job.total,
+        'percent': job.percent,
+        'message': job.message,
+        'error': job.error,
+        'attempts': job.attempts,
+        'max_attempts': job.max_attempts,
+        'cancel_requested': job.cancel_requested,
+        'result': {key: value for key, value in (job.result or {}).items() if key != 'file'} or None,
+        'created_at': _isoformat(job.created_at),
+        'started_at': _isoformat(job.started_at),
+        'finished_at': _isoformat(job.finished_at),
+        'updated_at': _isoformat(job.updated_at),
+    }
+    if job.kind == 'export' and job.status == 'succeeded':
+        data['download_url'] = url_for('main.download_job_result', id=job.id)
+    return data
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _course_counts(semesters):
+    """Course count per semester for a whole response in one grouped query"""
+    counts = {semester.id: 0 for semester in semesters}
+    if counts:
+        for _, semester_id, _, _, count in semester_aggregates(semester_ids=list(counts)):
+            counts[semester_id] = count
+    return counts
+
+
+def _sparse(data):
+    """Apply the ?fields=a,b sparse fieldset to a serialized object"""
+    fields = request.args.get('fields')
+    if not fields:
+        return data
+    wanted = set(fields.split(','))
+    return {key: value for key, value in data.items() if key in wanted}
+
+
+# Conditional responses
+
+def _etag(items, next_cursor=None):
+    """Weak validator built from the id and updated_at of every item in a response.
+
+    List pages also cover next_cursor: rows added after a full last page
+    change it from null without changing the items.
+    """
+    digest = hashlib.sha1(request.full_path.encode())
+    digest.update(f'next={next_cursor};'.encode())
+    for item in items:
+        digest.update(f'{item.id}:{_isoformat(item.updated_at)};'.encode())
+    return digest.hexdigest()
+
+
+def _conditional(items, build, next_cursor=None):
+    """Answer 304 if the client's ETag still matches, otherwise jsonify(build())"""
+    etag = _etag(items, next_cursor)
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+# Pagination
+
+def _encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode()
+
+
+def _paginate(query, model):
+    """Keyset pagination on id: ?limit=N&cursor=<next_cursor from the previous page>"""
+    limit = min(max(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int), 1),
+                current_app.config['API_MAX_PAGE_SIZE'])
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            query = query.filter(model.id > int(base64.urlsafe_b64decode(cursor.encode())))
+        except ValueError:
+            abort(400, description='Invalid cursor')
+
+    items = query.order_by(model.id).limit(limit + 1).all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = _encode_cursor(items[-1].id)
+    return items, next_cursor
+
+
+# Input validation
+
+def _form_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def _bind_form(form_class, data, obj=None, fields=()):
+    """Build an unvalidated form from a JSON object, filling gaps from obj's fields"""
+    values = {field: _form_value(getattr(obj, field)) for field in fields} if obj is not None else {}
+    values.update({key: _form_value(value) for key, value in data.items()})
+    return form_class(formdata=MultiDict(values), meta={'csrf': False})
+
+
+def _validate(form_class, data, obj=None, fields=()):
+    """Validate a JSON body with the same WTForms rules as the HTML forms.
+
+    For partial updates the object's current values fill in missing fields.
+    """
+    if not isinstance(data, dict):
+        abort(400, description='Request body must be a JSON object')
+
+    form = _bind_form(form_class, data, obj, fields)
+    if not form.validate():
+        _abort_invalid({'fields': form.errors})
+    return form
+
+
+def _abort_invalid(details):
+    response = jsonify(dict({'error': 'Validation failed'}, **details))
+    response.status_code = 422
+    abort(response)
+
+
+def _apply(form, obj, fields):
+    for field in fields:
+        setattr(obj, field, form[field].data)
+
+
+def _commit():
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        abort(409, description='A record with these values already exists')
+
+
+def _created(data, location):
+    response = jsonify(data)
+    response.status_code = 201
+    response.headers['Location'] = location
+    return response
+
+
+@api.before_request
+def route_reads_to_replica():
+    # Every API GET is read-only; writes still go to the primary
+    if request.method in ('GET', 'HEAD'):
+        g._use_replica = True
+
+
+@api.errorhandler(HTTPException)
+def handle_http_error(error):
+    if error.response is not None:
+        return error.response
+    response = jsonify({'error': error.description})
+    response.status_code = error.code
+    return response
+
+
+# Ownership
+
+def _get_student(id):
+    return owned_student_or_404(id, current_user.id)
+
+
+def _get_semester(id):
+    return owned_semester_or_404(id, current_user.id)
+
+
+def _get_course(id):
+    return owned_course_or_404(id, current_user.id)
+
+
+STUDENT_FIELDS = ['name', 'student_id', 'email', 'program', 'year']
+SEMESTER_FIELDS = ['name', 'semester_number', 'year', 'start_date', 'end_date']
+COURSE_FIELDS = ['course_name', 'subject_area', 'course_code', 'credits', 'marks']
+
+
+# Students
+
+@api.route('/students')
+@login_required
+def list_students():
+    students, next_cursor = _paginate(Student.query.filter_by(user_id=current_user.id), Student)
+    return _conditional(students, lambda: {
+        'data': [_sparse(serialize_student(student)) for student in students],
+        'next_cursor': next_cursor,
+    }, next_cursor)
+
+
+@api.route('/students', methods=['POST'])
+@login_required
+def create_student():
+    form = _validate(StudentForm, request.get_json(silent=True))
+    student = Student(user_id=current_user.id)
+    _apply(form, student, STUDENT_FIELDS)
+    db.session.add(student)
+    _commit()
+    return _created(serialize_student(student), url_for('api.get_student', id=student.id))
+
+
+@api.route('/students/<int:id>')
+@login_required
+def get_student(id):
+    student = _get_student(id)
+    return _conditional([student], lambda: _sparse(serialize_student(student)))
+
+
+@api.route('/students/<int:id>', methods=['PUT', 'PATCH'])
+@login_required
+def update_student(id):
+    student = _get_student(id)
+    obj = student if request.method == 'PATCH' else None
+    form = _validate(StudentForm, request.get_json(silent=True), obj, STUDENT_FIELDS)
+    _apply(form, student, STUDENT_FIELDS)
+    _commit()
+    return jsonify(serialize_student(student))
+
+
+@api.route('/students/<int:id>', methods=['DELETE'])
+@login_required
+def delete_student(id):
+    student = _get_student(id)
+    db.session.delete(student)
+    db.session.commit()
+    return '', 204
+
+
+# Semesters
+
+@api.route('/students/<int:student_id>/semesters')
+@login_required
+def list_semesters(student_id):
+    student = _get_student(student_id)
+    semesters, next_cursor = _paginate(Semester.query.filter_by(student_id=student.id), Semester)
+
+    def build():
+        counts = _course_counts(semesters)
+        return {
+            'data': [_sparse(serialize_semester(semester, counts[semester.id])) for semester in semesters],
+            'next_cursor': next_cursor,
+        }
+    return _conditional(semesters, build, next_cursor)
+
+
+@api.route('/students/<int:student_id>/semesters', methods=['POST'])
+@login_required
+def create_semester(student_id):
+    student = _get_student(student_id)
+    form = _validate(SemesterForm, request.get_json(silent=True))
+    semester = Semester(student_id=student.id)
+    _apply(form, semester, SEMESTER_FIELDS)
+    db.session.add(semester)
+    bump_data_version(student)
+    _commit()
+    return _created(serialize_semester(semester, 0), url_for('api.get_semester', id=semester.id))
+
+
+@api.route('/semesters/<int:id>')
+@login_required
+def get_semester(id):
+    semester = _get_semester(id)
+    return _conditional([semester], lambda: _sparse(
+        serialize_semester(semester, _course_counts([semester])[semester.id])))
+
+
+@api.route('/semesters/<int:id>', methods=['PUT', 'PATCH'])
+@login_required
+def update_semester(id):
+    semester = _get_semester(id)
+    obj = semester if request.method == 'PATCH' else None
+    form = _validate(SemesterForm, request.get_json(silent=True), obj, SEMESTER_FIELDS)
+    _apply(form, semester, SEMESTER_FIELDS)
+    bump_data_version(semester.student)
+    _commit()
+    return jsonify(serialize_semester(semester, _course_counts([semester])[semester.id]))
+
+
+@api.route('/semesters/<int:id>', methods=['DELETE'])
+@login_required
+def delete_semester(id):
+    semester = _get_semester(id)
+    db.session.delete(semester)
+    bump_data_version(semester.student)
+    db.session.commit()
+    return '', 204
+
+
+# Courses
+
+@api.route('/semesters/<int:semester_id>/courses')
+@login_required
+def list_courses(semester_id):
+    semester = _get_semester(semester_id)
+    courses, next_cursor = _paginate(Course.query.filter_by(semester_id=semester.id), Course)
+    return _conditional(courses, lambda: {
+        'data': [_sparse(serialize_course(course)) for course in courses],
+        'next_cursor': next_cursor,
+    }, next_cursor)
+
+
+@api.route('/semesters/<int:semester_id>/courses', methods=['POST'])
+@login_required
+def create_course(semester_id):
+    semester = _get_semester(semester_id)
+    form = _validate(CourseForm, request.get_json(silent=True))
+    course = Course(semester_id=semester.id)
+    _apply(form, course, COURSE_FIELDS)
+    db.session.add(course)
+    bump_data_version(semester.student)
+    _commit()
+    return _created(serialize_course(course), url_for('api.get_course', id=course.id))
+
+
+@api.route('/courses/<int:id>')
+@login_required
+def get_course(id):
+    course = _get_course(id)
+    return _conditional([course], lambda: _sparse(serialize_course(course)))
+
+
+@api.route('/courses/<int:id>', methods=['PUT', 'PATCH'])
+@login_required
+def update_course(id):
+    course = _get_course(id)
+    obj = course if request.method == 'PATCH' else None
+    form = _validate(CourseForm, request.get_json(silent=True), obj, COURSE_FIELDS)
+    _apply(form, course, COURSE_FIELDS)
+    bump_data_version(course.semester.student)
+    _commit()
+    return jsonify(serialize_course(course))
+
+
+@api.route('/courses/<int:id>', methods=['DELETE'])
+@login_required
+def delete_course(id):
+    course = _get_course(id)
+    db.session.delete(course)
+    bump_data_version(course.semester.student)
+    db.session.commit()
+    return '', 204
+
+
+# Batch course writes
+
+@api.route('/semesters/<int:semester_id>/courses/batch', methods=['POST'])
+@login_required
+def batch_semester_courses(semester_id):
+    semester = _get_semester(semester_id)
+    return _apply_course_batch(semester.student, {semester.id}, default_semester_id=semester.id)
+
+
+@api.route('/students/<int:student_id>/courses/batch', methods=['POST'])
+@login_required
+def batch_student_courses(student_id):
+    student = _get_student(student_id)
+    semester_ids = set(db.session.scalars(select(Semester.id).where(Semester.student_id == student.id)))
+    return _apply_course_batch(student, semester_ids)
+
+
+def _is_id(value):
+    # JSON true/false decode to bool, a subclass of int
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _apply_course_batch(student, semester_ids, default_semester_id=None):
+    """Validate and apply a list of course operations in one transaction.
+
+    Body: {"operations": [{"op": "create"|"update"|"delete", "id": ..., "semester_id": ...,
+    <course fields>}, ...]}. Ownership is checked once for the whole batch: every
+    semester and course touched must belong to the already-authorized student.
+    Nothing is written unless every operation is valid.
+    """
+    data = request.get_json(silent=True)
+    operations = data.get('operations') if isinstance(data, dict) else None
+    if not isinstance(operations, list) or not operations:
+        abort(400, description="Request body must be an object with a non-empty 'operations' list")
+    if len(operations) > current_app.config['API_MAX_BATCH_SIZE']:
+        abort(413, description=f"At most {current_app.config['API_MAX_BATCH_SIZE']} operations per batch")
+
+    course_ids = {op.get('id') for op in operations
+                  if isinstance(op, dict) and op.get('op') in ('update', 'delete') and _is_id(op.get('id'))}
+    existing = {}
+    if course_ids:
+        query = select(Course.id, Course.semester_id, *[getattr(Course, field) for field in COURSE_FIELDS]) \
+            .where(Course.id.in_(course_ids), Course.semester_id.in_(semester_ids))
+        existing = {row.id: row for row in db.session.execute(query)}
+
+    inserts, updates, deletes, errors = [], [], [], []
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get('op') not in ('create', 'update', 'delete'):
+            errors.append({'index': index, 'error': "'op' must be one of create, update, delete"})
+            continue
+
+        action = op['op']
+        fields = {key: value for key, value in op.items() if key not in ('op', 'id', 'semester_id')}
+
+        if action == 'create':
+            target_semester = op.get('semester_id', default_semester_id)
+            if not _is_id(target_semester):
+                errors.append({'index': index, 'error': "'semester_id' must be an integer"})
+                continue
+            if target_semester not in semester_ids:
+                errors.append({'index': index, 'error': 'Unknown semester_id'})
+                continue
+            form = _bind_form(CourseForm, fields)
+            if not form.validate():
+                errors.append({'index': index, 'fields': form.errors})
+                continue
+            inserts.append(dict({field: form[field].data for field in COURSE_FIELDS}, semester_id=target_semester))
+            continue
+
+        if not _is_id(op.get('id')):
+            errors.append({'index': index, 'error': "'id' must be an integer"})
+            continue
+        current = existing.get(op['id'])
+        if current is None:
+            errors.append({'index': index, 'error': 'Unknown course id'})
+        elif action == 'delete':
+            deletes.append(current.id)
+        else:
+            form = _bind_form(CourseForm, fields, current, COURSE_FIELDS)
+            if not form.validate():
+                errors.append({'index': index, 'fields': form.errors})
+                continue
+            updates.append(dict({field: form[field].data for field in COURSE_FIELDS}, id=current.id))
+
+    if errors:
+        _abort_invalid({'operations': errors})
+
+    created_ids = []
+    if inserts:
+        created_ids = list(db.session.scalars(insert(Course).returning(Course.id, sort_by_parameter_order=True),
+                                              inserts))
+    if updates:
+        db.session.execute(update(Course), updates)
+    if deletes:
+        db.session.execute(delete(Course).where(Course.id.in_(deletes)))
+
+    # Bulk statements bypass the flush-time totals listener
+    recompute_gpa_totals(student_ids=[student.id])
+    bump_data_version(student)
+    db.session.commit()
+
+    touched = {row['semester_id'] for row in inserts} | \
+        {existing[row['id']].semester_id for row in updates} | \
+        {existing[course_id].semester_id for course_id in deletes}
+    semesters = Semester.query.filter(Semester.id.in_(touched)).order_by(Semester.id).all()
+    counts = _course_counts(semesters)
+    return jsonify({
+        'created': created_ids,
+        'updated': len(updates),
+        'deleted': len(deletes),
+        'semesters': [
+            {'id': semester.id, 'gpa': semester.gpa, 'total_credits': float(semester.total_credits),
+             'course_count': counts[semester.id]}
+            for semester in semesters
+        ],
+        'cgpa': student.overall_cgpa,
+    })
+
+
+# Background jobs
+
+def _accepted(job):
+    response = jsonify(serialize_job(job))
+    response.status_code = 202
+    response.headers['Location'] = url_for('api.get_job', id=job.id)
+    return response
+
+
+@api.route('/jobs')
+@login_required
+def list_jobs():
+    items, next_cursor = _paginate(Job.query.filter_by(user_id=current_user.id), Job)
+    return _conditional(items, lambda: {
+        'data': [_sparse(serialize_job(job)) for job in items],
+        'next_cursor': next_cursor,
+    }, next_cursor)
+
+
+@api.route('/jobs', methods=['POST'])
+@login_required
+def create_job():
+    """Start an export ({"kind": "export", "format": "csv"|"jsonl"}) or a
+    recompute of the user's stored GPA totals ({"kind": "recompute-gpa-totals"})"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        abort(400, description='Request body must be a JSON object')
+
+    kind = data.get('kind')
+    if kind == 'export':
+        fmt = data.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            _abort_invalid({'fields': {'format': [f"Must be one of {', '.join(EXPORT_FORMATS)}"]}})
+        params = {'format': fmt}
+    elif kind == 'recompute-gpa-totals':
+        params = {}
+    else:
+        _abort_invalid({'fields': {'kind': ['Must be one of export, recompute-gpa-totals']}})
+    return _accepted(jobs.enqueue(kind, user_id=current_user.id, params=params))
+
+
+@api.route('/jobs/<int:id>')
+@login_required
+def get_job(id):
+    job = owned_job_or_404(id, current_user.id)
+    return _conditional([job], lambda: _sparse(serialize_job(job)))
+
+
+@api.route('/jobs/<int:id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(id):
+    return _accepted(jobs.cancel(owned_job_or_404(id, current_user.id)))
+
+
+@api.route('/jobs/<int:id>/retry', methods=['POST'])
+@login_required
+def retry_job(id):
+    job = owned_job_or_404(id, current_user.id)
+    if job.status not in ('failed', 'cancelled'):
+        abort(409, description='Only failed or cancelled jobs can be retried')
+    return _accepted(jobs.retry(job))
+
+
+# Cohort analytics
+
+def _cohort_args():
+    """program, year and subject_area filters of an analytics request"""
+    return {
+        'program': request.args.get('program') or None,
+        'year': request.args.get('year', type=int),
+        'subject_area': request.args.get('subject_area') or None,
+    }
+
+
+@api.route('/analytics/cohorts')
+@login_required
+def cohort_summary():
+    """CGPA size, mean and percentiles per ?group=program,year (or program, or year)"""
+    group_by = tuple(column for column in request.args.get('group', 'program,year').split(',') if column)
+    if not group_by or any(column not in ('program', 'year') for column in group_by):
+        abort(400, description="'group' must be program, year or program,year")
+    return jsonify({'data': analytics.cohorts(current_user.id, group_by)})
+
+
+@api.route('/analytics/subjects')
+@login_required
+def subject_summary():
+    return jsonify({'data': analytics.subjects(current_user.id)})
+
+
+@api.route('/analytics/rankings')
+@login_required
+def cohort_rankings():
+    """Ranked students of a cohort, e.g. ?program=Physics&top=10 for the top 10%"""
+    top = request.args.get('top', type=float)
+    if top is not None and not 0 < top <= 100:
+        abort(400, description="'top' must be a percentage between 0 and 100")
+    limit = min(max(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int), 1),
+                current_app.config['API_MAX_PAGE_SIZE'])
+    offset = max(request.args.get('offset', 0, type=int), 0)
+
+    rows = analytics.rankings(current_user.id, top=top, limit=limit, offset=offset, **_cohort_args())
+    return jsonify({
+        'data': rows,
+        'cohort_size': rows[0]['cohort_size'] if rows else None,
+        'next_offset': offset + limit if len(rows) == limit else None,
+    })
+
+
+@api.route('/analytics/distribution')
+@login_required
+def cohort_distribution():
+    """Histogram of a cohort's CGPA in ?bucket=0.5 grade point buckets"""
+    bucket = request.args.get('bucket', 0.5, type=float)
+    if not 0.05 <= bucket <= get_grading_scale().max_point:
+        abort(400, description="'bucket' must be between 0.05 and the top grade point")
+    return jsonify({'data': analytics.distribution(current_user.id, bucket_width=bucket, **_cohort_args())})
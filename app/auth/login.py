@@ -0,0 +1,103 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from threading import Lock
+from sqlalchemy import update
+from app.cache import TTLCache
+from app.models import db, User
+
+logger = logging.getLogger(__name__)
+
+
+class LoginThrottle:
+    """Counts failed logins per client IP and per username.
+
+    Once either count reaches its limit within LOGIN_THROTTLE_WINDOW
+    seconds, further attempts are refused before the password is hashed.
+    Each failure extends the window; a successful login clears the
+    username's count. Counts are kept per process.
+    """
+
+    def __init__(self):
+        self.max_per_ip = 20
+        self.max_per_user = 5
+        self.window = 300
+        self.failures = TTLCache(maxsize=10000, ttl=self.window)
+
+    def init_app(self, app):
+        self.max_per_ip = app.config.get('LOGIN_MAX_FAILURES_PER_IP', 20)
+        self.max_per_user = app.config.get('LOGIN_MAX_FAILURES_PER_USER', 5)
+        self.window = app.config.get('LOGIN_THROTTLE_WINDOW', 300)
+        self.failures = TTLCache(maxsize=app.config.get('LOGIN_THROTTLE_SIZE', 10000), ttl=self.window)
+
+    def is_blocked(self, ip, username):
+        return (self.max_per_ip and self.failures.get(('ip', ip), 0) >= self.max_per_ip) or \
+            (self.max_per_user and self.failures.get(('user', username.lower()), 0) >= self.max_per_user)
+
+    def failed(self, ip, username):
+        for key in (('ip', ip), ('user', username.lower())):
+            self.failures.set(key, self.failures.get(key, 0) + 1)
+
+    def succeeded(self, username):
+        self.failures.delete(('user', username.lower()))
+
+
+class LastLoginRecorder:
+    """Coalesces last_login updates into one bulk UPDATE every few seconds.
+
+    Logins only record the timestamp in memory; a daemon thread writes all
+    pending timestamps every LAST_LOGIN_FLUSH_INTERVAL seconds, and once
+    more at exit. An interval of 0 writes synchronously instead.
+    """
+
+    def __init__(self):
+        self.interval = 10
+        self._app = None
+        self._pending = {}
+        self._lock = Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.interval = app.config.get('LAST_LOGIN_FLUSH_INTERVAL', 10)
+        if self._app is None:
+            atexit.register(self.flush)
+        self._app = app
+
+    def record(self, user_id, when=None):
+        when = when or datetime.utcnow()
+        if not self.interval:
+            db.session.execute(update(User).where(User.id == user_id).values(last_login=when))
+            db.session.commit()
+            return
+
+        with self._lock:
+            self._pending[user_id] = when
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='last-login-writer', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Write all pending last_login timestamps in one statement"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self._app is None:
+            return
+        with self._app.app_context():
+            try:
+                db.session.execute(update(User), [{'id': user_id, 'last_login': when}
+                                                  for user_id, when in pending.items()])
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Could not write %d last_login timestamp(s)', len(pending))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+login_throttle = LoginThrottle()
+last_logins = LastLoginRecorder()
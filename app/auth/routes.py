@@ -3,7 +3,7 @@ from flask_login import login_user, logout_user, login_required, current_user
 from app.auth import auth
 from app.models import db, User
 from app.auth.forms import LoginForm, RegistrationForm
-from datetime import datetime
+from app.auth.login import login_throttle, last_logins
 
 @auth.route('/register', methods=['GET', 'POST'])
 def register():
@@ -32,15 +32,24 @@ def login():
 
     form = LoginForm()
     if form.validate_on_submit():
+        # Refuse floods before paying for the password hash
+        if login_throttle.is_blocked(request.remote_addr, form.username.data):
+            flash('Too many failed login attempts. Please try again later.', 'error')
+            return render_template('auth/login.html', form=form), 429
+
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            login_throttle.succeeded(form.username.data)
+            if user.password_needs_rehash():
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user, remember=form.remember_me.data)
-            user.last_login = datetime.utcnow()
-            db.session.commit()
+            last_logins.record(user.id)
             next_page = request.args.get('next')
             flash(f'Welcome back, {user.username}!', 'success')
             return redirect(next_page) if next_page else redirect(url_for('main.dashboard'))
         else:
+            login_throttle.failed(request.remote_addr, form.username.data)
             flash('Invalid username or password', 'error')
 
     return render_template('auth/login.html', form=form)
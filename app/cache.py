@@ -0,0 +1,194 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from threading import Lock
+from flask import g, has_app_context
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """Bounded, thread-safe LRU store whose entries expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if self.ttl and expires_at < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (self.ttl or 0))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class GPACache:
+    """Two-level memoization for GPA computations.
+
+    Values are first memoized on flask.g for the current request, then in a
+    TTLCache shared by every request in the process. Keys include the
+    student's data_version, so writes that bump it make old entries
+    unreachable instead of having to find and delete them.
+    """
+
+    def __init__(self):
+        self.store = TTLCache()
+
+    def init_app(self, app):
+        self.store = TTLCache(maxsize=app.config.get('GPA_CACHE_SIZE', 1024),
+                              ttl=app.config.get('GPA_CACHE_TTL', 300))
+
+    def _request_memo(self):
+        if not has_app_context():
+            return None
+        if '_gpa_memo' not in g:
+            g._gpa_memo = {}
+        return g._gpa_memo
+
+    def get_or_compute(self, key, compute):
+        memo = self._request_memo()
+        if memo is not None and key in memo:
+            return memo[key]
+
+        value = self.store.get(key)
+        if value is None:
+            value = compute()
+            self.store.set(key, value)
+
+        if memo is not None:
+            memo[key] = value
+        return value
+
+    def memoize(self, key_func):
+        """Decorate a function of one model instance; key_func(obj) builds the key"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(obj):
+                key = (func.__name__,) + tuple(key_func(obj))
+                return self.get_or_compute(key, lambda: func(obj))
+            return wrapper
+        return decorator
+
+
+class RedisStore:
+    """TTLCache-like get/set/delete on Redis, shared by every worker; needs redis-py.
+
+    Values are stored as JSON. Errors are logged and treated as misses, so
+    the database stays the fallback when Redis is unavailable.
+    """
+
+    def __init__(self, url, prefix, ttl):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError('A shared cache store needs redis-py: pip install redis')
+        self.client = redis.Redis.from_url(url, socket_timeout=0.5)
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def get(self, key, default=None):
+        try:
+            raw = self.client.get(f'{self.prefix}{key}')
+        except Exception as e:
+            logger.warning('Shared cache get failed: %s', e)
+            return default
+        return default if raw is None else json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(f'{self.prefix}{key}', json.dumps(value), ex=self.ttl or None)
+        except Exception as e:
+            logger.warning('Shared cache set failed: %s', e)
+
+    def delete(self, key):
+        try:
+            self.client.delete(f'{self.prefix}{key}')
+        except Exception as e:
+            logger.warning('Shared cache delete failed: %s', e)
+
+
+class UserCache:
+    """Caches the identity columns of users for Flask-Login's user_loader.
+
+    Entries live in an in-process TTLCache and, when USER_CACHE_REDIS_URL
+    is set, in Redis shared by all workers. They are deleted when a user is
+    updated or deleted (see models._invalidate_cached_users); other
+    processes' in-process copies expire after USER_CACHE_TTL seconds.
+    """
+
+    fields = ('id', 'username', 'email', 'created_at')
+
+    def __init__(self):
+        self.local = TTLCache()
+        self.shared = None
+
+    def init_app(self, app):
+        ttl = app.config.get('USER_CACHE_TTL', 60)
+        self.local = TTLCache(maxsize=app.config.get('USER_CACHE_SIZE', 4096), ttl=ttl)
+        url = app.config.get('USER_CACHE_REDIS_URL')
+        self.shared = RedisStore(url, 'cgpa:user:', ttl) if url else None
+
+    def get(self, user_id):
+        """Cached column values of a user, or None"""
+        data = self.local.get(user_id)
+        if data is None and self.shared is not None:
+            data = self.shared.get(user_id)
+            if data is not None:
+                data['created_at'] = data['created_at'] and datetime.fromisoformat(data['created_at'])
+                self.local.set(user_id, data)
+        return data
+
+    def set(self, user):
+        data = {field: getattr(user, field) for field in self.fields}
+        self.local.set(user.id, data)
+        if self.shared is not None:
+            self.shared.set(user.id, dict(data, created_at=data['created_at'] and data['created_at'].isoformat()))
+
+    def delete(self, user_id):
+        self.local.delete(user_id)
+        if self.shared is not None:
+            self.shared.delete(user_id)
+
+
+gpa_cache = GPACache()
+user_cache = UserCache()
+
+
+def bump_data_version(student):
+    """Invalidate cached GPA values for a student after a course or semester write.
+
+    The increment is flushed as data_version = data_version + 1, so
+    concurrent writers each get a new version; the attribute is reloaded
+    from the row when next read.
+    """
+    student.data_version = type(student).data_version + 1
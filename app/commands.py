@@ -0,0 +1,214 @@
+import os
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from sqlalchemy import select
+from app.models import db, User, Job
+from app.jobs import jobs, FINISHED
+from app.utils import recompute_gpa_totals
+from app.importer import import_courses, CourseImportError
+from app.exporter import export_rows, summary_rows, stream_export, EXPORT_FORMATS, SUMMARY_COLUMNS
+from app.routing import replica_reads
+from app.summary import gpa_summary
+from app.synthetic import SyntheticDataset, write_csv, write_database, write_parquet
+
+
+def register_commands(app):
+    """Attach the application's maintenance commands to the flask CLI"""
+
+    @app.cli.command('check-gpa-totals')
+    @click.option('--fix', is_flag=True, help='Overwrite drifted totals with recomputed values.')
+    def check_gpa_totals(fix):
+        """Recompute stored GPA totals from courses and report any drift."""
+        drift = recompute_gpa_totals(fix=fix)
+
+        for kind, row_id, stored, expected in drift:
+            click.echo(f'{kind} {row_id}: stored credits={stored[0]} points={stored[1]}, '
+                       f'expected credits={expected[0]} points={expected[1]}')
+
+        if not drift:
+            click.echo('All stored GPA totals are consistent.')
+        elif fix:
+            db.session.commit()
+            click.echo(f'Fixed {len(drift)} drifted row(s).')
+        else:
+            click.echo(f'{len(drift)} drifted row(s) found. Re-run with --fix to repair.')
+            raise SystemExit(1)
+
+    @app.cli.command('refresh-gpa-summary')
+    @click.option('--full', is_flag=True, help='Rebuild every student, not just missing or outdated rows.')
+    def refresh_gpa_summary_command(full):
+        """Bring student_gpa_summary up to date with the stored GPA totals."""
+        if full:
+            count = gpa_summary.refresh_all()
+            click.echo(f'Refreshed the GPA summary of {count} student(s).')
+        else:
+            students, orphans = gpa_summary.refresh_stale()
+            click.echo(f'Refreshed {students} outdated student(s) and deleted {orphans} orphaned row(s).')
+
+    @app.cli.command('import-courses')
+    @click.argument('csv_file', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--user', 'username', required=True, help='Username that will own the imported students.')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Rows per transaction (default: IMPORT_BATCH_SIZE).')
+    def import_courses_command(csv_file, username, batch_size):
+        """Bulk import students, semesters and courses from CSV_FILE ('-' for stdin)."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"No user named '{username}'")
+
+        try:
+            counts = import_courses(csv_file, user,
+                                    batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+                                    use_copy=current_app.config['IMPORT_USE_COPY'])
+        except CourseImportError as e:
+            raise click.ClickException(str(e))
+
+        click.echo(f"Imported {counts['rows']} row(s): {counts['students_created']} student(s), "
+                   f"{counts['semesters_created']} semester(s) and {counts['courses_created']} course(s) created, "
+                   f"{counts['courses_updated']} course(s) updated.")
+
+    @app.cli.command('export')
+    @click.option('--user', 'username', required=True, help='Username whose records are exported.')
+    @click.option('--format', 'fmt', type=click.Choice(list(EXPORT_FORMATS)), default='csv', show_default=True)
+    @click.option('-o', '--output', type=click.File('w'), default='-', help='Output file (default: stdout).')
+    @click.option('--summary', is_flag=True, help='One row per student from the GPA summary table.')
+    def export_command(username, fmt, output, summary):
+        """Stream a user's students, semesters, courses and GPAs as CSV or JSONL."""
+        user = User.query.filter_by(username=username).first()
+        if user is None:
+            raise click.ClickException(f"No user named '{username}'")
+
+        with replica_reads():
+            if summary:
+                chunks = stream_export(summary_rows(user.id), fmt, columns=SUMMARY_COLUMNS)
+            else:
+                chunks = stream_export(export_rows(user.id), fmt)
+            for chunk in chunks:
+                output.write(chunk)
+
+    @app.cli.command('generate-data')
+    @click.option('--users', type=int, default=1, show_default=True, help='Number of users to generate.')
+    @click.option('--students', type=int, default=100, show_default=True, help='Students per user.')
+    @click.option('--seed', type=int, default=0, show_default=True, help='Random seed; same seed, same data.')
+    @click.option('--prefix', default='SYN', show_default=True, help='Prefix of generated usernames and Student IDs.')
+    @click.option('--format', 'fmt', type=click.Choice(['db', 'csv', 'parquet']), default='db', show_default=True,
+                  help='Insert into the database, or write a CSV/Parquet file in the import format.')
+    @click.option('-o', '--output', help="Output file for csv/parquet ('-' for stdout with csv).")
+    @click.option('--batch-size', type=int, default=None,
+                  help='Students per transaction with --format db (default: IMPORT_BATCH_SIZE).')
+    @click.option('--password', default='password', show_default=True, help='Password of generated users.')
+    def generate_data_command(users, students, seed, prefix, fmt, output, batch_size, password):
+        """Generate deterministic synthetic users, students, semesters and courses."""
+        dataset = SyntheticDataset(users=users, students_per_user=students, seed=seed, prefix=prefix)
+
+        if fmt == 'db':
+            try:
+                counts = write_database(dataset, batch_size=batch_size or current_app.config['IMPORT_BATCH_SIZE'],
+                                        password=password, use_copy=current_app.config['IMPORT_USE_COPY'])
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            click.echo(f"Generated {counts['users']} user(s), {counts['students']} student(s), "
+                       f"{counts['semesters']} semester(s) and {counts['courses']} course(s).")
+            return
+
+        if not output:
+            raise click.ClickException(f'--output is required with --format {fmt}')
+        if fmt == 'csv':
+            with click.open_file(output, 'w') as file:
+                rows = write_csv(dataset, file)
+        else:
+            try:
+                rows = write_parquet(dataset, output)
+            except RuntimeError as e:
+                raise click.ClickException(str(e))
+        click.echo(f'Wrote {rows} course row(s) to {output}.', err=output == '-')
+
+    @app.cli.group('jobs')
+    def jobs_group():
+        """Run and manage background jobs."""
+
+    @jobs_group.command('work')
+    @click.option('--workers', type=int, default=None, help='Worker threads (default: JOB_WORKERS, at least 1).')
+    def work_command(workers):
+        """Run job workers in the foreground; Ctrl-C stops after the running jobs finish."""
+        workers = workers or current_app.config['JOB_WORKERS'] or 1
+        jobs.requeue_stale()
+        jobs.start(workers=workers)
+        click.echo(f'Running {workers} job worker(s). Press Ctrl-C to stop.')
+        try:
+            jobs.join()
+        except KeyboardInterrupt:
+            click.echo('Stopping after running jobs finish...')
+            jobs.stop()
+            jobs.join()
+
+    @jobs_group.command('list')
+    @click.option('--status', type=click.Choice(['queued', 'running', 'succeeded', 'failed', 'cancelled']))
+    @click.option('--limit', type=int, default=20, show_default=True)
+    def list_jobs_command(status, limit):
+        """Show the most recent jobs."""
+        query = select(Job).order_by(Job.id.desc()).limit(limit)
+        if status:
+            query = query.where(Job.status == status)
+        for job in db.session.scalars(query):
+            progress = f'{job.progress}/{job.total}' if job.total else str(job.progress)
+            click.echo(f'{job.id}\t{job.kind}\t{job.status}\t{progress}\t'
+                       f'attempt {job.attempts}/{job.max_attempts}\t{job.error or job.message or ""}')
+
+    @jobs_group.command('enqueue')
+    @click.argument('kind')
+    @click.option('--user', 'username', help='Run as this user (e.g. to recompute only their students).')
+    @click.option('--param', 'params', multiple=True, metavar='KEY=VALUE', help='Job parameter; may be repeated.')
+    def enqueue_command(kind, username, params):
+        """Queue a job, e.g. `flask jobs enqueue recompute-gpa-totals` after changing GRADING_SCALE."""
+        if kind not in jobs.tasks:
+            raise click.ClickException(f"Unknown job kind '{kind}'; choose from {', '.join(sorted(jobs.tasks))}")
+        user_id = None
+        if username:
+            user = User.query.filter_by(username=username).first()
+            if user is None:
+                raise click.ClickException(f"No user named '{username}'")
+            user_id = user.id
+        try:
+            values = dict(param.split('=', 1) for param in params)
+        except ValueError:
+            raise click.ClickException('Parameters must look like KEY=VALUE')
+        job = jobs.enqueue(kind, user_id=user_id, params=values)
+        click.echo(f'Queued job {job.id} ({kind}); a web process or `flask jobs work` will run it.')
+
+    @jobs_group.command('cancel')
+    @click.argument('job_id', type=int)
+    def cancel_command(job_id):
+        """Cancel a queued or running job."""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            raise click.ClickException(f'No job {job_id}')
+        job = jobs.cancel(job)
+        click.echo(f'Job {job.id}: {job.status}' + (' (cancel requested)' if job.cancel_requested else ''))
+
+    @jobs_group.command('retry')
+    @click.argument('job_id', type=int)
+    def retry_command(job_id):
+        """Queue a failed or cancelled job again."""
+        job = db.session.get(Job, job_id)
+        if job is None:
+            raise click.ClickException(f'No job {job_id}')
+        if job.status not in ('failed', 'cancelled'):
+            raise click.ClickException(f'Job {job_id} is {job.status}; only failed or cancelled jobs can be retried')
+        job = jobs.retry(job)
+        click.echo(f'Job {job.id}: {job.status}')
+
+    @jobs_group.command('prune')
+    @click.option('--days', type=int, default=7, show_default=True, help='Keep jobs that finished more recently.')
+    def prune_command(days):
+        """Delete finished jobs and their upload/export files."""
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        old = db.session.scalars(select(Job).where(Job.status.in_(FINISHED), Job.finished_at < cutoff)).all()
+        for job in old:
+            for name in ((job.params or {}).get('file'), (job.result or {}).get('file')):
+                if name and os.path.exists(jobs.file_path(name)):
+                    os.remove(jobs.file_path(name))
+            db.session.delete(job)
+        db.session.commit()
+        click.echo(f'Deleted {len(old)} job(s).')
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+from sqlalchemy import select
+from app.models import db, Student, Semester, Course, GPASummary
+from app.utils import get_grading_scale, gpa_from_totals
+
+# Column order of CSV exports; the student/semester/course columns match the
+# import format so an export can be re-imported as-is.
+EXPORT_COLUMNS = [
+    'Student ID', 'Student Name', 'Program', 'Year', 'CGPA',
+    'Semester', 'Semester Number', 'Semester GPA', 'Semester Credits',
+    'Course Name', 'Subject Area', 'Course Code', 'Credits', 'Marks', 'Grade Point',
+]
+# Columns of the one-row-per-student summary export
+SUMMARY_COLUMNS = ['Student ID', 'Student Name', 'Program', 'Year', 'CGPA', 'Credits', 'Semesters', 'Courses',
+                   'Refreshed At']
+EXPORT_FORMATS = {'csv': 'text/csv', 'jsonl': 'application/x-ndjson'}
+
+
+def export_rows(user_id, yield_per=1000):
+    """Yield one plain dict per course (or per empty student/semester) for a user.
+
+    Rows come from a single outer-joined query streamed with a server-side
+    cursor, and GPA values are derived from the stored totals, so memory use
+    does not grow with the number of courses.
+    """
+    grade_point = get_grading_scale().grade_point
+    query = select(
+        Student.student_id, Student.name, Student.program, Student.year,
+        Student.total_credits, Student.weighted_points,
+        Semester.name, Semester.semester_number, Semester.total_credits, Semester.weighted_points,
+        Course.course_name, Course.subject_area, Course.course_code, Course.credits, Course.marks
+    ).select_from(Student) \
+        .outerjoin(Semester, Semester.student_id == Student.id) \
+        .outerjoin(Course, Course.semester_id == Semester.id) \
+        .where(Student.user_id == user_id) \
+        .order_by(Student.id, Semester.semester_number, Semester.id, Course.id)
+
+    result = db.session.execute(query, execution_options={'yield_per': yield_per, 'stream_results': True})
+    for (student_code, student_name, program, year, student_credits, student_points,
+         semester_name, semester_number, semester_credits, semester_points,
+         course_name, subject_area, course_code, credits, marks) in result:
+        has_semester = semester_name is not None
+        has_course = course_name is not None
+        yield {
+            'Student ID': student_code,
+            'Student Name': student_name,
+            'Program': program,
+            'Year': year,
+            'CGPA': gpa_from_totals(float(student_credits), float(student_points)),
+            'Semester': semester_name,
+            'Semester Number': semester_number,
+            'Semester GPA': gpa_from_totals(float(semester_credits), float(semester_points)) if has_semester else None,
+            'Semester Credits': float(semester_credits) if has_semester else None,
+            'Course Name': course_name,
+            'Subject Area': subject_area,
+            'Course Code': course_code,
+            'Credits': float(credits) if has_course else None,
+            'Marks': float(marks) if has_course else None,
+            'Grade Point': grade_point(marks) if has_course else None,
+        }
+
+
+def summary_rows(user_id, yield_per=1000):
+    """Yield one plain dict per student from student_gpa_summary.
+
+    Reads the precomputed row of each student instead of joining courses;
+    counts may lag the latest writes by GPA_SUMMARY_REFRESH_INTERVAL, and
+    students not refreshed yet have empty values.
+    """
+    query = select(
+        Student.student_id, Student.name, Student.program, Student.year, GPASummary.gpa,
+        GPASummary.total_credits, GPASummary.semester_count, GPASummary.course_count, GPASummary.refreshed_at
+    ).outerjoin(Student.summary) \
+        .where(Student.user_id == user_id) \
+        .order_by(Student.id)
+
+    result = db.session.execute(query, execution_options={'yield_per': yield_per, 'stream_results': True})
+    for student_code, name, program, year, gpa, credits, semesters, courses, refreshed_at in result:
+        yield {
+            'Student ID': student_code,
+            'Student Name': name,
+            'Program': program,
+            'Year': year,
+            'CGPA': float(gpa) if gpa is not None else None,
+            'Credits': float(credits) if credits is not None else None,
+            'Semesters': semesters,
+            'Courses': courses,
+            'Refreshed At': refreshed_at.isoformat() if refreshed_at else None,
+        }
+
+
+def stream_export(rows, fmt='csv', chunk_size=500, columns=EXPORT_COLUMNS):
+    """Encode export rows as CSV or JSONL text, yielding chunks of chunk_size rows"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'")
+
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=columns, lineterminator='\n')
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            buffer.write(json.dumps(row) + '\n')
+
+    for count, row in enumerate(rows, 1):
+        write(row)
+        if count % chunk_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
@@ -0,0 +1,74 @@
+import hashlib
+import json
+from flask import current_app
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from app.cache import TTLCache, RedisStore
+
+
+class FragmentCache:
+    """Rendered template fragments keyed on the values they depend on.
+
+    Keys name the fragment and the versions of the records it shows, e.g.
+    ('student-card', student.id, student.data_version, student.updated_at),
+    so writes that bump those values make stale fragments unreachable and
+    the LRU evicts them. Fragments live in an in-process TTLCache and, when
+    FRAGMENT_CACHE_REDIS_URL is set, in Redis shared by all workers.
+    """
+
+    def __init__(self):
+        self.local = TTLCache()
+        self.shared = None
+        self._scale_hash = (None, None)
+
+    def init_app(self, app):
+        ttl = app.config.get('FRAGMENT_CACHE_TTL', 3600)
+        self.local = TTLCache(maxsize=app.config.get('FRAGMENT_CACHE_SIZE', 2048), ttl=ttl)
+        url = app.config.get('FRAGMENT_CACHE_REDIS_URL')
+        self.shared = RedisStore(url, 'cgpa:fragment:', ttl) if url else None
+        app.jinja_env.add_extension(FragmentCacheExtension)
+
+    def _key_prefix(self):
+        # A deploy changes the markup and the grading scale changes grade points and
+        # GPAs in every fragment; a JSON scale can change content under the same name
+        scale = current_app.extensions['grading_scale']
+        if self._scale_hash[0] is not scale:
+            content = json.dumps(scale.to_dict(), sort_keys=True).encode()
+            self._scale_hash = (scale, hashlib.sha1(content).hexdigest()[:12])
+        return f"{current_app.extensions['release']}:{self._scale_hash[1]}"
+
+    def get_or_render(self, parts, render):
+        key = ':'.join(str(part) for part in [self._key_prefix()] + list(parts))
+        html = self.local.get(key)
+        if html is None and self.shared is not None:
+            html = self.shared.get(key)
+            if html is not None:
+                self.local.set(key, html)
+        if html is None:
+            html = str(render())
+            self.local.set(key, html)
+            if self.shared is not None:
+                self.shared.set(key, html)
+        return Markup(html)
+
+
+class FragmentCacheExtension(Extension):
+    """{% cache 'name', record.id, record.updated_at %}...{% endcache %}"""
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body) \
+            .set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        return fragment_cache.get_or_render(parts, caller)
+
+
+fragment_cache = FragmentCache()
@@ -0,0 +1,271 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert, select, update
+from app.models import db, Student, Semester, Course
+from app.utils import recompute_gpa_totals
+from app.summary import gpa_summary
+
+# Columns of the app.py CSV format plus the student and semester they belong to
+REQUIRED_COLUMNS = ['Student ID', 'Semester', 'Course Name', 'Credits', 'Marks']
+OPTIONAL_COLUMNS = ['Student Name', 'Semester Number', 'Subject Area', 'Course Code']
+
+
+class CourseImportError(Exception):
+    """Raised for invalid import files; line is the 1-based CSV line number"""
+
+    def __init__(self, message, line=None):
+        self.line = line
+        super().__init__(f'Line {line}: {message}' if line else message)
+
+
+def _parse_row(row, line):
+    """Validate one CSV row with the same limits as CourseForm.
+
+    Rows without Course Name, Credits and Marks (as exported for students
+    without semesters and semesters without courses) only create the
+    student, and the semester if one is named.
+    """
+    def text(column, max_length, required=False):
+        value = (row.get(column) or '').strip()
+        if required and not value:
+            raise CourseImportError(f"'{column}' is required", line)
+        if len(value) > max_length:
+            raise CourseImportError(f"'{column}' must be less than {max_length} characters", line)
+        return value or None
+
+    def number(column, minimum, maximum):
+        try:
+            value = Decimal((row.get(column) or '').strip())
+            if not value.is_finite():
+                raise InvalidOperation()
+        except InvalidOperation:
+            raise CourseImportError(f"'{column}' must be a number", line)
+        if not minimum <= value <= maximum:
+            raise CourseImportError(f"'{column}' must be between {minimum} and {maximum}", line)
+        return value
+
+    has_course = any((row.get(column) or '').strip() for column in ('Course Name', 'Credits', 'Marks'))
+    semester_number = (row.get('Semester Number') or '').strip()
+    semester = text('Semester', 50, required=has_course)
+    if semester is None:
+        semester_number = ''
+    elif not semester_number and semester.isdigit():
+        semester_number = semester
+    if semester_number and not semester_number.isdigit():
+        raise CourseImportError("'Semester Number' must be a whole number", line)
+    if semester_number and int(semester_number) < 1:
+        raise CourseImportError("'Semester Number' must be at least 1", line)
+
+    parsed = {
+        'student_code': text('Student ID', 50, required=True),
+        'student_name': text('Student Name', 100),
+        'semester': semester,
+        'semester_number': int(semester_number) if semester_number else None,
+    }
+    if not has_course:
+        return dict(parsed, course_name=None)
+    return {
+        **parsed,
+        'course_name': text('Course Name', 200, required=True),
+        'subject_area': text('Subject Area', 100),
+        'course_code': text('Course Code', 50),
+        'credits': number('Credits', Decimal('0.5'), Decimal(10)),
+        'marks': number('Marks', Decimal(0), Decimal(100)),
+    }
+
+
+def _dialect_insert(model):
+    """INSERT for model that silently skips rows violating a unique constraint"""
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as upsert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as upsert
+    else:
+        return insert(model)
+    return upsert(model).on_conflict_do_nothing()
+
+
+def _copy_courses(rows):
+    """Insert course rows with COPY on psycopg connections; False if unavailable"""
+    connection = db.session.connection()
+    if connection.dialect.name != 'postgresql':
+        return False
+    driver_connection = connection.connection.driver_connection
+    with driver_connection.cursor() as cursor:
+        if not hasattr(cursor, 'copy'):
+            return False
+        now = datetime.utcnow()
+        with cursor.copy('COPY courses (semester_id, course_name, subject_area, course_code, '
+                         'credits, marks, created_at, updated_at) FROM STDIN') as copy:
+            for row in rows:
+                copy.write_row((row['semester_id'], row['course_name'], row['subject_area'],
+                                row['course_code'], row['credits'], row['marks'], now, now))
+    return True
+
+
+class CourseImporter:
+    """Upsert students, semesters and courses from CSV rows in batches.
+
+    Each batch runs in its own transaction: one SELECT and one multi-row
+    INSERT per table, plus a bulk UPDATE for courses that already exist.
+    Students are matched on Student ID, semesters on name (or number) within
+    the student, and courses on course code (or name) within the semester.
+    If a batch fails it is rolled back; earlier batches stay committed.
+    progress, if given, is called with the number of rows imported so far
+    after each batch commits.
+    """
+
+    def __init__(self, user, batch_size=1000, use_copy=True, progress=None):
+        self.user = user
+        self.batch_size = batch_size
+        self.use_copy = use_copy
+        self.progress = progress
+        self.counts = dict.fromkeys(
+            ['rows', 'students_created', 'semesters_created', 'courses_created', 'courses_updated'], 0)
+
+    def run(self, file):
+        """Import an open text-mode CSV file; returns counts of what was written"""
+        reader = csv.DictReader(file)
+        missing = [column for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            raise CourseImportError(f"Missing required column(s): {', '.join(missing)}")
+
+        batch = []
+        for row in reader:
+            batch.append(_parse_row(row, reader.line_num))
+            if len(batch) >= self.batch_size:
+                self._commit_batch(batch)
+                batch = []
+        if batch:
+            self._commit_batch(batch)
+        return self.counts
+
+    def _commit_batch(self, rows):
+        try:
+            student_ids = self._import_batch(rows)
+            recompute_gpa_totals(student_ids=student_ids)
+            db.session.execute(update(Student).where(Student.id.in_(student_ids))
+                               .values(data_version=Student.data_version + 1))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        # Core statements skip the ORM events that queue summary refreshes
+        gpa_summary.mark(student_ids)
+        self.counts['rows'] += len(rows)
+        if self.progress is not None:
+            self.progress(self.counts['rows'])
+
+    def _students(self, codes):
+        query = select(Student.student_id, Student.id, Student.user_id).where(Student.student_id.in_(codes))
+        return {code: (student_id, user_id) for code, student_id, user_id in db.session.execute(query)}
+
+    def _import_batch(self, rows):
+        # Students
+        codes = {row['student_code'] for row in rows}
+        students = self._students(codes)
+        new_students = {}
+        for row in rows:
+            code = row['student_code']
+            if code not in students and code not in new_students:
+                new_students[code] = {'user_id': self.user.id, 'student_id': code,
+                                      'name': row['student_name'] or code}
+        if new_students:
+            # Rows skipped by ON CONFLICT DO NOTHING (created concurrently) are not returned
+            created = db.session.execute(_dialect_insert(Student).returning(Student.id),
+                                         list(new_students.values())).all()
+            students = self._students(codes)
+            self.counts['students_created'] += len(created)
+
+        for code, (_, user_id) in students.items():
+            if user_id != self.user.id:
+                raise CourseImportError(f"Student ID '{code}' belongs to another user")
+        student_pks = {code: student_id for code, (student_id, _) in students.items()}
+
+        # Semesters
+        semesters, next_number = self._semesters(student_pks.values())
+        new_semesters = {}
+        for row in rows:
+            if row['semester'] is None:
+                continue
+            student_pk = student_pks[row['student_code']]
+            if self._semester_key(semesters, student_pk, row) is not None:
+                continue
+            number = row['semester_number']
+            if number is None:
+                number = next_number.get(student_pk, 1)
+            next_number[student_pk] = max(next_number.get(student_pk, 1), number + 1)
+            semester = {'student_id': student_pk, 'name': row['semester'], 'semester_number': number}
+            new_semesters[(student_pk, number)] = semester
+            # Later rows for the same semester resolve to this pending insert
+            semesters[(student_pk, row['semester'])] = semesters[(student_pk, number)] = None
+        if new_semesters:
+            created = db.session.execute(_dialect_insert(Semester).returning(Semester.id),
+                                         list(new_semesters.values())).all()
+            semesters, _ = self._semesters(student_pks.values())
+            self.counts['semesters_created'] += len(created)
+
+        # Courses
+        rows = [row for row in rows if row['course_name'] is not None]
+        semester_ids = {}
+        for row in rows:
+            row['semester_id'] = semester_ids.setdefault(
+                (row['student_code'], row['semester']),
+                semesters[self._semester_key(semesters, student_pks[row['student_code']], row)])
+
+        existing = {}
+        query = select(Course.id, Course.semester_id, Course.course_code, Course.course_name) \
+            .where(Course.semester_id.in_(set(semester_ids.values())))
+        for course_id, semester_id, course_code, course_name in db.session.execute(query):
+            existing[(semester_id, course_code or course_name)] = course_id
+
+        inserts = {}
+        updates = {}
+        for row in rows:
+            key = (row['semester_id'], row['course_code'] or row['course_name'])
+            values = {column: row[column] for column in
+                      ('semester_id', 'course_name', 'subject_area', 'course_code', 'credits', 'marks')}
+            if key in existing:
+                updates[existing[key]] = dict(values, id=existing[key])
+            else:
+                inserts[key] = values
+
+        if inserts:
+            if not (self.use_copy and _copy_courses(inserts.values())):
+                db.session.execute(insert(Course), list(inserts.values()))
+            self.counts['courses_created'] += len(inserts)
+        if updates:
+            db.session.execute(update(Course), list(updates.values()))
+            self.counts['courses_updated'] += len(updates)
+
+        return list(set(student_pks.values()))
+
+    @staticmethod
+    def _semester_key(semesters, student_pk, row):
+        """Key of the semester a row belongs to in a _semesters mapping, if any"""
+        if (student_pk, row['semester']) in semesters:
+            return (student_pk, row['semester'])
+        if row['semester_number'] is not None and (student_pk, row['semester_number']) in semesters:
+            return (student_pk, row['semester_number'])
+        return None
+
+    @staticmethod
+    def _semesters(student_pks):
+        """Map (student pk, name) and (student pk, number) to semester ids"""
+        semesters = {}
+        next_number = {}
+        query = select(Semester.id, Semester.student_id, Semester.name, Semester.semester_number) \
+            .where(Semester.student_id.in_(set(student_pks)))
+        for semester_id, student_pk, name, number in db.session.execute(query):
+            semesters[(student_pk, name)] = semester_id
+            if number is not None:
+                semesters[(student_pk, number)] = semester_id
+                next_number[student_pk] = max(next_number.get(student_pk, 1), number + 1)
+        return semesters, next_number
+
+
+def import_courses(file, user, batch_size=1000, use_copy=True, progress=None):
+    """Import a CSV file of courses for user; see CourseImporter"""
+    return CourseImporter(user, batch_size, use_copy, progress).run(file)
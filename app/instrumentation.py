@@ -0,0 +1,182 @@
+import hmac
+import json
+import logging
+import time
+from bisect import bisect_left
+from threading import Lock
+from flask import abort, current_app, g, request, has_request_context, before_render_template, template_rendered
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('app.requests')
+
+# Upper bounds (seconds) of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteMetrics:
+    """Per-endpoint request counters and latency histograms, kept in process"""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._routes = {}
+
+    def observe(self, endpoint, method, status, duration, query_count, db_time):
+        with self._lock:
+            route = self._routes.setdefault((endpoint, method), {
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+                'count': 0, 'sum': 0.0, 'queries': 0, 'db_time': 0.0, 'status': {},
+            })
+            route['buckets'][bisect_left(LATENCY_BUCKETS, duration)] += 1
+            route['count'] += 1
+            route['sum'] += duration
+            route['queries'] += query_count
+            route['db_time'] += db_time
+            route['status'][status] = route['status'].get(status, 0) + 1
+
+    def render(self):
+        """Prometheus text exposition format"""
+        lines = [
+            '# HELP http_request_duration_seconds Request latency by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            routes = sorted(self._routes.items())
+            for (endpoint, method), route in routes:
+                labels = f'endpoint="{endpoint}",method="{method}"'
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), route['buckets']):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {route["sum"]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {route["count"]}')
+
+            lines += ['# HELP http_requests_total Requests by route and status.',
+                      '# TYPE http_requests_total counter']
+            for (endpoint, method), route in routes:
+                for status, count in sorted(route['status'].items()):
+                    lines.append(f'http_requests_total{{endpoint="{endpoint}",method="{method}",'
+                                 f'status="{status}"}} {count}')
+
+            lines += ['# HELP db_queries_total SQL statements executed by route.',
+                      '# TYPE db_queries_total counter']
+            for (endpoint, method), route in routes:
+                lines.append(f'db_queries_total{{endpoint="{endpoint}",method="{method}"}} {route["queries"]}')
+
+            lines += ['# HELP db_time_seconds_total Time spent in SQL statements by route.',
+                      '# TYPE db_time_seconds_total counter']
+            for (endpoint, method), route in routes:
+                lines.append(f'db_time_seconds_total{{endpoint="{endpoint}",method="{method}"}} '
+                             f'{route["db_time"]:.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+class Instrumentation:
+    """Per-request SQL, template and latency accounting.
+
+    Every request gets a query count, total DB time, template render time
+    and its slowest statements. They are reported in a Server-Timing
+    header, a structured log line on the 'app.requests' logger, and the
+    Prometheus-style /metrics endpoint, which needs METRICS_TOKEN as a
+    bearer token (or a logged-in user when no token is configured).
+    """
+
+    def __init__(self):
+        self.metrics = RouteMetrics()
+        self.slow_query_count = 3
+
+    def init_app(self, app):
+        if not app.config.get('INSTRUMENTATION_ENABLED', True):
+            return
+        self.slow_query_count = app.config.get('SLOW_QUERY_COUNT', 3)
+
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+        before_render_template.connect(_before_render, app)
+        template_rendered.connect(_after_render, app)
+        app.before_request(_start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self._metrics_view)
+
+    def _finish_request(self, response):
+        stats = g.get('_request_stats')
+        if stats is None:
+            return response
+
+        duration = time.perf_counter() - stats['start']
+        endpoint = request.endpoint or 'unknown'
+        self.metrics.observe(endpoint, request.method, response.status_code,
+                             duration, stats['queries'], stats['db_time'])
+
+        response.headers.add('Server-Timing', ', '.join([
+            f'db;dur={stats["db_time"] * 1000:.2f};desc="{stats["queries"]} queries"',
+            f'tpl;dur={stats["template_time"] * 1000:.2f}',
+            f'app;dur={duration * 1000:.2f}',
+        ]))
+
+        slowest = sorted(stats['statements'], reverse=True)[:self.slow_query_count]
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration * 1000, 2),
+            'queries': stats['queries'],
+            'db_ms': round(stats['db_time'] * 1000, 2),
+            'template_ms': round(stats['template_time'] * 1000, 2),
+            'slowest': [{'ms': round(elapsed * 1000, 2), 'sql': statement[:200]}
+                        for elapsed, statement in slowest],
+        }))
+        return response
+
+    def _metrics_view(self):
+        token = current_app.config.get('METRICS_TOKEN')
+        if token:
+            supplied = request.headers.get('Authorization', '')
+            if not hmac.compare_digest(supplied.encode(), f'Bearer {token}'.encode()):
+                abort(401)
+        elif not current_user.is_authenticated:
+            return current_app.login_manager.unauthorized()
+        return self.metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def _start_request():
+    g._request_stats = {'start': time.perf_counter(), 'queries': 0, 'db_time': 0.0,
+                        'template_time': 0.0, 'statements': []}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # A statement that raises never reaches after_cursor_execute; the next one overwrites its start
+    conn.info['query_start'] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.pop('query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if not has_request_context():
+        return
+    stats = g.get('_request_stats')
+    if stats is not None:
+        stats['queries'] += 1
+        stats['db_time'] += elapsed
+        stats['statements'].append((elapsed, statement))
+
+
+def _before_render(sender, template, context, **extra):
+    stats = g.get('_request_stats')
+    if stats is not None:
+        stats.setdefault('render_start', []).append(time.perf_counter())
+
+
+def _after_render(sender, template, context, **extra):
+    stats = g.get('_request_stats')
+    if stats is not None and stats.get('render_start'):
+        stats['template_time'] += time.perf_counter() - stats['render_start'].pop()
+
+
+instrumentation = Instrumentation()
@@ -0,0 +1,324 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update, or_
+from app.models import db, Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """Raised from JobContext.progress once a running job has been cancelled"""
+
+
+class JobFailed(Exception):
+    """Raised by tasks for errors that a retry cannot fix, e.g. an invalid file"""
+
+
+class JobContext:
+    """What a task gets: the job's owner and params, plus progress reporting.
+
+    progress() writes to the jobs row on its own connection, so pollers see
+    it straight away; call it between transactions. It is also where a
+    cancelled job stops, by raising JobCancelled.
+    """
+
+    def __init__(self, queue, job):
+        self.queue = queue
+        self.job_id = job.id
+        self.user_id = job.user_id
+        self.params = dict(job.params or {})
+        self.attempts = job.attempts
+        self.max_attempts = job.max_attempts
+        self._reported_at = None
+
+    def progress(self, done, total=None, message=None):
+        now = datetime.utcnow()
+        if self._reported_at is not None and total != done and \
+                (now - self._reported_at).total_seconds() < self.queue.progress_interval:
+            return
+        self._reported_at = now
+
+        values = {'progress': done, 'heartbeat_at': now}
+        if total is not None:
+            values['total'] = total
+        if message is not None:
+            values['message'] = message[:255]
+        with db.engine.begin() as connection:
+            connection.execute(update(Job).where(Job.id == self.job_id).values(**values))
+            cancel = connection.execute(select(Job.cancel_requested).where(Job.id == self.job_id)).scalar()
+        if cancel:
+            raise JobCancelled()
+
+
+class JobQueue:
+    """Database-backed job queue with an in-process pool of worker threads.
+
+    Jobs are rows in the jobs table, so they survive restarts and any
+    process can enqueue, poll or cancel them. JOB_WORKERS threads per
+    process claim queued jobs with a conditional UPDATE (only one worker
+    wins a job) and run the task registered for its kind in a fresh app
+    context. Threads start with the first web request, or with `flask jobs
+    work`; enqueue() and retry() only write the row, so CLI commands that
+    queue a job exit without claiming it. Set JOB_WORKERS=0 to keep web
+    workers free and run `flask jobs work` in a separate process instead.
+
+    A task that raises is retried up to max_attempts times, waiting
+    JOB_RETRY_DELAY seconds and twice as long for each further attempt;
+    JobFailed fails the job at once. Running jobs send a heartbeat, and a
+    job whose heartbeat stops for JOB_STALE_AFTER seconds (its process
+    died) is queued again, or cancelled if a cancel was requested.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.workers = 2
+        self.poll_interval = 5
+        self.max_attempts = 3
+        self.retry_delay = 30
+        self.heartbeat_interval = 15
+        self.stale_after = 120
+        self.progress_interval = 1
+        self.storage_dir = None
+        self._app = None
+        self._threads = []
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def init_app(self, app):
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self.poll_interval = app.config.get('JOB_POLL_INTERVAL', 5)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 3)
+        self.retry_delay = app.config.get('JOB_RETRY_DELAY', 30)
+        self.heartbeat_interval = app.config.get('JOB_HEARTBEAT_INTERVAL', 15)
+        self.stale_after = app.config.get('JOB_STALE_AFTER', 120)
+        self.progress_interval = app.config.get('JOB_PROGRESS_INTERVAL', 1)
+        self.storage_dir = app.config.get('JOB_STORAGE_DIR') or os.path.join(app.instance_path, 'jobs')
+        if self._app is None:
+            atexit.register(self.stop)
+        self._app = app
+        app.extensions['jobs'] = self
+
+        with app.app_context():
+            engine = db.engine
+            if engine.dialect.name == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+                # Workers write progress while other threads read; without WAL an open
+                # SQLite read blocks every commit from another connection
+                event.listen(engine, 'connect', _sqlite_wal)
+
+        @app.before_request
+        def start_job_workers():
+            if not self._threads and self.workers:
+                self.start()
+
+    def task(self, kind):
+        """Register a function taking a JobContext as the task for jobs of this kind.
+
+        Its return value (JSON-serializable) becomes the job's result.
+        """
+        def decorator(func):
+            self.tasks[kind] = func
+            return func
+        return decorator
+
+    def enqueue(self, kind, user_id=None, params=None, max_attempts=None):
+        """Queue a job and commit; returns the Job"""
+        if kind not in self.tasks:
+            raise ValueError(f"Unknown job kind '{kind}'")
+        job = Job(kind=kind, user_id=user_id, params=params or {}, status=QUEUED,
+                  max_attempts=max_attempts or self.max_attempts)
+        db.session.add(job)
+        db.session.commit()
+        self._wake.set()
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued job now; a running one stops at its next progress report"""
+        now = datetime.utcnow()
+        cancelled = db.session.execute(
+            update(Job).where(Job.id == job.id, Job.status == QUEUED)
+            .values(status=CANCELLED, finished_at=now, message='Cancelled')
+        ).rowcount
+        if not cancelled:
+            db.session.execute(update(Job).where(Job.id == job.id, Job.status == RUNNING)
+                               .values(cancel_requested=True))
+        db.session.commit()
+        db.session.refresh(job)
+        return job
+
+    def retry(self, job):
+        """Queue a failed or cancelled job again with a fresh set of attempts"""
+        db.session.execute(
+            update(Job).where(Job.id == job.id, Job.status.in_([FAILED, CANCELLED]))
+            .values(status=QUEUED, attempts=0, cancel_requested=False, error=None, message=None,
+                    progress=0, result=None, run_after=None, started_at=None, finished_at=None)
+        )
+        db.session.commit()
+        db.session.refresh(job)
+        self._wake.set()
+        return job
+
+    def file_path(self, name):
+        """Path of a file in JOB_STORAGE_DIR (uploads and export results)"""
+        os.makedirs(self.storage_dir, exist_ok=True)
+        return os.path.join(self.storage_dir, os.path.basename(name))
+
+    # Workers
+
+    def start(self, workers=None):
+        """Start the worker threads and the heartbeat thread (once per process)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for number in range(workers or self.workers):
+                self._threads.append(threading.Thread(target=self._work, name=f'job-worker-{number}',
+                                                      daemon=True))
+            self._threads.append(threading.Thread(target=self._supervise, name='job-heartbeat', daemon=True))
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self):
+        self._stopping.set()
+        self._wake.set()
+
+    def join(self):
+        for thread in list(self._threads):
+            thread.join()
+
+    @property
+    def worker_name(self):
+        return f'{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}'
+
+    def _work(self):
+        while not self._stopping.is_set():
+            try:
+                with self._app.app_context():
+                    job = self._claim()
+                    if job is not None:
+                        self._run(job)
+            except Exception:
+                logger.exception('Job worker error')
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _claim(self):
+        now = datetime.utcnow()
+        candidates = db.session.scalars(
+            select(Job.id).where(Job.status == QUEUED, or_(Job.run_after.is_(None), Job.run_after <= now))
+            .order_by(Job.id).limit(10)
+        ).all()
+        for job_id in candidates:
+            claimed = db.session.execute(
+                update(Job).where(Job.id == job_id, Job.status == QUEUED)
+                .values(status=RUNNING, worker=self.worker_name, attempts=Job.attempts + 1,
+                        started_at=now, heartbeat_at=now, cancel_requested=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.get(Job, job_id)
+        return None
+
+    def _run(self, job):
+        job_id, attempts, max_attempts = job.id, job.attempts, job.max_attempts
+        task = self.tasks.get(job.kind)
+        with self._lock:
+            self._running.add(job_id)
+        try:
+            if task is None:
+                raise JobFailed(f"Unknown job kind '{job.kind}'")
+            result = task(JobContext(self, job))
+        except JobCancelled:
+            db.session.rollback()
+            self._finish(job_id, status=CANCELLED, message='Cancelled')
+        except JobFailed as e:
+            db.session.rollback()
+            self._finish(job_id, status=FAILED, error=str(e))
+        except Exception as e:
+            db.session.rollback()
+            logger.exception('Job %s (%s) failed on attempt %d of %d', job_id, job.kind, attempts, max_attempts)
+            error = f'{type(e).__name__}: {e}'
+            if attempts < max_attempts:
+                delay = timedelta(seconds=self.retry_delay * 2 ** (attempts - 1))
+                self._finish(job_id, status=QUEUED, error=error, run_after=datetime.utcnow() + delay,
+                             finished_at=None, message=f'Retrying after attempt {attempts} failed')
+            else:
+                self._finish(job_id, status=FAILED, error=error)
+        else:
+            values = {'status': SUCCEEDED, 'result': result, 'error': None}
+            total = db.session.scalar(select(Job.total).where(Job.id == job_id))
+            if total is not None:
+                values['progress'] = total
+            self._finish(job_id, **values)
+        finally:
+            with self._lock:
+                self._running.discard(job_id)
+
+    def _finish(self, job_id, **values):
+        values.setdefault('finished_at', datetime.utcnow())
+        db.session.execute(update(Job).where(Job.id == job_id).values(worker=None, **values))
+        db.session.commit()
+
+    def _supervise(self):
+        while not self._stopping.wait(self.heartbeat_interval):
+            try:
+                with self._app.app_context():
+                    self._heartbeat()
+                    self.requeue_stale()
+            except Exception:
+                logger.exception('Job heartbeat failed')
+
+    def _heartbeat(self):
+        with self._lock:
+            running = list(self._running)
+        if running:
+            db.session.execute(update(Job).where(Job.id.in_(running)).values(heartbeat_at=datetime.utcnow()))
+            db.session.commit()
+
+    def requeue_stale(self):
+        """Queue running jobs whose worker stopped sending heartbeats.
+
+        Jobs with a pending cancel are cancelled and jobs out of attempts fail
+        instead; returns (requeued, failed).
+        """
+        stale = Job.status == RUNNING, Job.heartbeat_at < datetime.utcnow() - timedelta(seconds=self.stale_after)
+        cancelled = db.session.execute(
+            update(Job).where(*stale, Job.cancel_requested.is_(True))
+            .values(status=CANCELLED, worker=None, finished_at=datetime.utcnow(), message='Cancelled')
+        ).rowcount
+        failed = db.session.execute(
+            update(Job).where(*stale, Job.attempts >= Job.max_attempts)
+            .values(status=FAILED, worker=None, finished_at=datetime.utcnow(), error='Worker stopped responding')
+        ).rowcount
+        requeued = db.session.execute(
+            update(Job).where(*stale).values(status=QUEUED, worker=None, message='Worker stopped responding')
+        ).rowcount
+        db.session.commit()
+        if cancelled or failed or requeued:
+            logger.warning('Requeued %d, failed %d and cancelled %d job(s) from unresponsive workers',
+                           requeued, failed, cancelled)
+            self._wake.set()
+        return requeued, failed
+
+
+def _sqlite_wal(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.close()
+
+
+jobs = JobQueue()
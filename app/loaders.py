@@ -0,0 +1,80 @@
+from flask import abort
+from sqlalchemy import select
+from sqlalchemy.orm import contains_eager, make_transient_to_detached
+from app.cache import user_cache
+from app.models import db, User, Student, Semester, Course, Job
+
+
+def load_user(user_id):
+    """User for Flask-Login's user_loader, built from user_cache without a query on hits.
+
+    Columns that are not cached (password_hash, last_login) load lazily if
+    they are accessed.
+    """
+    user = db.session.identity_map.get(db.inspect(User).identity_key_from_primary_key([user_id]))
+    if user is not None:
+        return user
+
+    data = user_cache.get(user_id)
+    if data is None:
+        user = db.session.get(User, user_id)
+        if user is not None:
+            user_cache.set(user)
+        return user
+
+    user = User(**data)
+    make_transient_to_detached(user)
+    db.session.add(user)
+    return user
+
+
+def owned_student_or_404(id, user_id):
+    """Load a student owned by user_id in one query, or 404"""
+    query = select(Student).where(Student.id == id, Student.user_id == user_id)
+    return _first_or_404(query)
+
+
+def owned_semester_or_404(id, user_id):
+    """Load a semester with its student in one query, filtered on the owner in SQL, or 404"""
+    query = select(Semester) \
+        .join(Semester.student) \
+        .where(Semester.id == id, Student.user_id == user_id) \
+        .options(contains_eager(Semester.student))
+    return _first_or_404(query)
+
+
+def owned_course_or_404(id, user_id):
+    """Load a course with its semester and student in one query, or 404"""
+    query = select(Course) \
+        .join(Course.semester) \
+        .join(Semester.student) \
+        .where(Course.id == id, Student.user_id == user_id) \
+        .options(contains_eager(Course.semester).contains_eager(Semester.student))
+    return _first_or_404(query)
+
+
+def owned_job_or_404(id, user_id):
+    """Load a background job started by user_id, or 404"""
+    return _first_or_404(select(Job).where(Job.id == id, Job.user_id == user_id))
+
+
+def student_semesters(student):
+    """A student's semesters ordered by number, in one query"""
+    return db.session.scalars(
+        select(Semester).where(Semester.student_id == student.id)
+        .order_by(Semester.semester_number, Semester.id)
+    ).all()
+
+
+def semester_courses(semester):
+    """A semester's courses in insertion order, in one query"""
+    return db.session.scalars(
+        select(Course).where(Course.semester_id == semester.id).order_by(Course.id)
+    ).all()
+
+
+def _first_or_404(query):
+    obj = db.session.scalars(query).first()
+    if obj is None:
+        abort(404)
+    return obj
@@ -1,4 +1,5 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileRequired, FileAllowed
 from wtforms import StringField, IntegerField, DecimalField, SelectField, DateField, SubmitField
 from wtforms.validators import DataRequired, Email, Optional, NumberRange, Length, ValidationError
 from app.models import Student
@@ -70,3 +71,11 @@ class CourseForm(FlaskForm):
         NumberRange(min=0, max=100, message='Marks must be between 0 and 100')
     ], places=2)
     submit = SubmitField('Save Course')
+
+
+class ImportCoursesForm(FlaskForm):
+    csv_file = FileField('CSV File', validators=[
+        FileRequired(),
+        FileAllowed(['csv'], 'Please upload a .csv file')
+    ])
+    submit = SubmitField('Import Courses')
@@ -1,15 +1,47 @@
-from flask import render_template, redirect, url_for, flash, request, abort
+import os
+import uuid
+from functools import partial
+from flask import render_template, redirect, url_for, flash, request, abort, current_app, \
+    Response, stream_with_context, send_file
 from flask_login import login_required, current_user
+from sqlalchemy import select, func
+from sqlalchemy.orm import contains_eager
 from app.main import main
-from app.models import db, Student, Semester, Course
-from app.main.forms import StudentForm, SemesterForm, CourseForm
+from app.models import db, Student, Semester, Course, GPASummary
+from app.main.forms import StudentForm, SemesterForm, CourseForm, ImportCoursesForm
+from app.cache import bump_data_version
+from app.routing import read_replica
+from app.http_cache import conditional_page
+from app.exporter import export_rows, summary_rows, stream_export, EXPORT_FORMATS, SUMMARY_COLUMNS
+from app.jobs import jobs
+from app.loaders import owned_student_or_404, owned_semester_or_404, owned_course_or_404, \
+    owned_job_or_404, student_semesters, semester_courses
 
 @main.route('/')
 @main.route('/dashboard')
+@read_replica
 @login_required
 def dashboard():
-    students = Student.query.filter_by(user_id=current_user.id).all()
-    return render_template('main/dashboard.html', students=students)
+    page = request.args.get('page', 1, type=int)
+    # Deleting a student does not move max(updated_at), so no Last-Modified here; the count covers it in the ETag.
+    # Summary refreshes land after the write that caused them, so their time is part of it too.
+    last_refreshed = select(func.max(GPASummary.refreshed_at)) \
+        .where(GPASummary.user_id == current_user.id).scalar_subquery()
+    count, last_updated, last_refreshed = db.session.execute(
+        select(func.count(Student.id), func.max(Student.updated_at), last_refreshed)
+        .where(Student.user_id == current_user.id)
+    ).one()
+
+    def render():
+        # Semester and course counts come from each student's summary row, loaded in the same query
+        pagination = Student.query.filter_by(user_id=current_user.id) \
+            .outerjoin(Student.summary).options(contains_eager(Student.summary)) \
+            .order_by(Student.name, Student.id) \
+            .paginate(page=page, per_page=current_app.config['STUDENTS_PER_PAGE'], error_out=False, count=False)
+        pagination.total = count
+        return render_template('main/dashboard.html', students=pagination.items, pagination=pagination)
+
+    return conditional_page((count, last_updated, last_refreshed), None, render)
 
 
 @main.route('/students/new', methods=['GET', 'POST'])
@@ -34,20 +66,20 @@ def create_student():
 
 
 @main.route('/students/<int:id>')
+@read_replica
 @login_required
 def view_student(id):
-    student = Student.query.get_or_404(id)
-    if student.user_id != current_user.id:
-        abort(403)
-    return render_template('main/student_detail.html', student=student)
+    student = owned_student_or_404(id, current_user.id)
+    # Semester and course writes bump data_version, which also moves the student's updated_at
+    return conditional_page(
+        (student.id, student.data_version, student.updated_at), student.updated_at,
+        lambda: render_template('main/student_detail.html', student=student, semesters=student_semesters(student)))
 
 
 @main.route('/students/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_student(id):
-    student = Student.query.get_or_404(id)
-    if student.user_id != current_user.id:
-        abort(403)
+    student = owned_student_or_404(id, current_user.id)
 
     form = StudentForm(obj=student)
     if form.validate_on_submit():
@@ -66,9 +98,7 @@ def edit_student(id):
 @main.route('/students/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_student(id):
-    student = Student.query.get_or_404(id)
-    if student.user_id != current_user.id:
-        abort(403)
+    student = owned_student_or_404(id, current_user.id)
 
     name = student.name
     db.session.delete(student)
@@ -80,9 +110,7 @@ def delete_student(id):
 @main.route('/students/<int:student_id>/semesters/new', methods=['GET', 'POST'])
 @login_required
 def create_semester(student_id):
-    student = Student.query.get_or_404(student_id)
-    if student.user_id != current_user.id:
-        abort(403)
+    student = owned_student_or_404(student_id, current_user.id)
 
     form = SemesterForm()
     if form.validate_on_submit():
@@ -95,6 +123,7 @@ def create_semester(student_id):
             end_date=form.end_date.data
         )
         db.session.add(semester)
+        bump_data_version(student)
         db.session.commit()
         flash(f'Semester {semester.name} created successfully!', 'success')
         return redirect(url_for('main.view_semester', id=semester.id))
@@ -103,20 +132,23 @@ def create_semester(student_id):
 
 
 @main.route('/semesters/<int:id>')
+@read_replica
 @login_required
 def view_semester(id):
-    semester = Semester.query.get_or_404(id)
-    if semester.student.user_id != current_user.id:
-        abort(403)
-    return render_template('main/semester_detail.html', semester=semester)
+    semester = owned_semester_or_404(id, current_user.id)
+    student = semester.student
+    # The page shows the student's name and ID, which edit_student changes without bumping data_version
+    return conditional_page(
+        (semester.id, semester.updated_at, student.data_version, student.updated_at),
+        max(filter(None, (semester.updated_at, student.updated_at)), default=None),
+        lambda: render_template('main/semester_detail.html', semester=semester,
+                                load_courses=partial(semester_courses, semester)))
 
 
 @main.route('/semesters/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_semester(id):
-    semester = Semester.query.get_or_404(id)
-    if semester.student.user_id != current_user.id:
-        abort(403)
+    semester = owned_semester_or_404(id, current_user.id)
 
     form = SemesterForm(obj=semester)
     if form.validate_on_submit():
@@ -125,6 +157,7 @@ def edit_semester(id):
         semester.year = form.year.data
         semester.start_date = form.start_date.data
         semester.end_date = form.end_date.data
+        bump_data_version(semester.student)
         db.session.commit()
         flash(f'Semester {semester.name} updated successfully!', 'success')
         return redirect(url_for('main.view_semester', id=semester.id))
@@ -135,13 +168,12 @@ def edit_semester(id):
 @main.route('/semesters/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_semester(id):
-    semester = Semester.query.get_or_404(id)
-    if semester.student.user_id != current_user.id:
-        abort(403)
+    semester = owned_semester_or_404(id, current_user.id)
 
     student_id = semester.student_id
     name = semester.name
     db.session.delete(semester)
+    bump_data_version(semester.student)
     db.session.commit()
     flash(f'Semester {name} deleted successfully!', 'success')
     return redirect(url_for('main.view_student', id=student_id))
@@ -150,9 +182,7 @@ def delete_semester(id):
 @main.route('/semesters/<int:semester_id>/courses/new', methods=['GET', 'POST'])
 @login_required
 def create_course(semester_id):
-    semester = Semester.query.get_or_404(semester_id)
-    if semester.student.user_id != current_user.id:
-        abort(403)
+    semester = owned_semester_or_404(semester_id, current_user.id)
 
     form = CourseForm()
     if form.validate_on_submit():
@@ -165,6 +195,7 @@ def create_course(semester_id):
             marks=form.marks.data
         )
         db.session.add(course)
+        bump_data_version(semester.student)
         db.session.commit()
         flash(f'Course {course.course_name} added successfully!', 'success')
         return redirect(url_for('main.view_semester', id=semester.id))
@@ -175,9 +206,7 @@ def create_course(semester_id):
 @main.route('/courses/<int:id>/edit', methods=['GET', 'POST'])
 @login_required
 def edit_course(id):
-    course = Course.query.get_or_404(id)
-    if course.semester.student.user_id != current_user.id:
-        abort(403)
+    course = owned_course_or_404(id, current_user.id)
 
     form = CourseForm(obj=course)
     if form.validate_on_submit():
@@ -186,6 +215,7 @@ def edit_course(id):
         course.course_code = form.course_code.data
         course.credits = form.credits.data
         course.marks = form.marks.data
+        bump_data_version(course.semester.student)
         db.session.commit()
         flash(f'Course {course.course_name} updated successfully!', 'success')
         return redirect(url_for('main.view_semester', id=course.semester_id))
@@ -196,13 +226,107 @@ def edit_course(id):
 @main.route('/courses/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_course(id):
-    course = Course.query.get_or_404(id)
-    if course.semester.student.user_id != current_user.id:
-        abort(403)
+    course = owned_course_or_404(id, current_user.id)
 
     semester_id = course.semester_id
     name = course.course_name
     db.session.delete(course)
+    bump_data_version(course.semester.student)
     db.session.commit()
     flash(f'Course {name} deleted successfully!', 'success')
     return redirect(url_for('main.view_semester', id=semester_id))
+
+
+@main.route('/import', methods=['GET', 'POST'])
+@login_required
+def import_courses():
+    form = ImportCoursesForm()
+    if form.validate_on_submit():
+        # Large files take a while; import in the background and show the job's progress
+        name = f'import-{uuid.uuid4().hex}.csv'
+        form.csv_file.data.save(jobs.file_path(name))
+        job = jobs.enqueue('import-courses', user_id=current_user.id,
+                           params={'file': name, 'filename': form.csv_file.data.filename})
+        flash('Import started.', 'info')
+        return redirect(url_for('main.view_job', id=job.id))
+
+    return render_template('main/import_form.html', form=form)
+
+
+@main.route('/export')
+@main.route('/export.<fmt>')
+@read_replica
+@login_required
+def export(fmt='csv'):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    chunks = stream_export(export_rows(current_user.id), fmt)
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=cgpa-export.{fmt}'
+    return response
+
+
+@main.route('/export/summary')
+@main.route('/export/summary.<fmt>')
+@read_replica
+@login_required
+def export_summary(fmt='csv'):
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+
+    chunks = stream_export(summary_rows(current_user.id), fmt, columns=SUMMARY_COLUMNS)
+    response = Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=cgpa-summary.{fmt}'
+    return response
+
+
+@main.route('/export/background', methods=['POST'])
+@login_required
+def export_background():
+    fmt = request.form.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(404)
+    job = jobs.enqueue('export', user_id=current_user.id, params={'format': fmt})
+    return redirect(url_for('main.view_job', id=job.id))
+
+
+@main.route('/jobs/<int:id>')
+@login_required
+def view_job(id):
+    job = owned_job_or_404(id, current_user.id)
+    return render_template('main/job_detail.html', job=job)
+
+
+@main.route('/jobs/<int:id>/download')
+@login_required
+def download_job_result(id):
+    job = owned_job_or_404(id, current_user.id)
+    if job.kind != 'export' or job.status != 'succeeded':
+        abort(404)
+    path = jobs.file_path(job.result['file'])
+    if not os.path.exists(path):
+        abort(404)
+    fmt = job.result['format']
+    return send_file(path, mimetype=EXPORT_FORMATS[fmt],
+                     as_attachment=True, download_name=f'cgpa-export.{fmt}')
+
+
+@main.route('/jobs/<int:id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(id):
+    job = jobs.cancel(owned_job_or_404(id, current_user.id))
+    flash('Job cancelled.' if job.status == 'cancelled' else 'Cancelling job...', 'info')
+    return redirect(url_for('main.view_job', id=job.id))
+
+
+@main.route('/jobs/<int:id>/retry', methods=['POST'])
+@login_required
+def retry_job(id):
+    job = owned_job_or_404(id, current_user.id)
+    if job.status not in ('failed', 'cancelled'):
+        flash('Only failed or cancelled jobs can be retried.', 'error')
+        return redirect(url_for('main.view_job', id=job.id))
+    job = jobs.retry(job)
+    flash('Job queued again.', 'info')
+    return redirect(url_for('main.view_job', id=job.id))
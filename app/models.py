@@ -1,10 +1,14 @@
+from collections import defaultdict
 from datetime import datetime
+from decimal import Decimal
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, event, inspect
+from app.routing import RoutingSession
+from app.passwords import hash_password, verify_password, needs_rehash
+from app.cache import user_cache
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -19,10 +23,14 @@ class User(UserMixin, db.Model):
     students = db.relationship('Student', backref='user', lazy='dynamic', cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Whether the stored hash predates the configured PASSWORD_HASH_METHOD"""
+        return needs_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -41,12 +49,31 @@ class Student(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Rolled up from semesters by _maintain_gpa_totals; weighted_points is
+    # the sum of each semester's rounded GPA times its credits.
+    total_credits = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
+    weighted_points = db.Column(db.Numeric(14, 4), nullable=False, default=0, server_default='0')
+
+    # Bumped by app.cache.bump_data_version on course/semester writes; part of GPA cache keys
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     semesters = db.relationship('Semester', backref='student', lazy='dynamic', cascade='all, delete-orphan')
 
+    # The student's row in student_gpa_summary; may lag behind writes by a few seconds
+    summary = db.relationship('GPASummary', uselist=False, viewonly=True,
+                              primaryjoin='and_(GPASummary.student_id == Student.id, GPASummary.semester_id.is_(None))')
+
+    __table_args__ = (
+        # Cohort analytics filter a user's students on program and year
+        db.Index('ix_students_user_program_year', 'user_id', 'program', 'year'),
+        # The dashboard pages through a user's students by name
+        db.Index('ix_students_user_name', 'user_id', 'name'),
+    )
+
     @property
     def overall_cgpa(self):
-        from app.utils import calculate_overall_cgpa
-        return calculate_overall_cgpa(self)
+        from app.utils import gpa_from_totals
+        return gpa_from_totals(float(self.total_credits or 0), float(self.weighted_points or 0))
 
     def __repr__(self):
         return f'<Student {self.name}>'
@@ -65,6 +92,10 @@ class Semester(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Maintained incrementally from courses by _maintain_gpa_totals
+    total_credits = db.Column(db.Numeric(8, 2), nullable=False, default=0, server_default='0')
+    weighted_points = db.Column(db.Numeric(10, 2), nullable=False, default=0, server_default='0')
+
     courses = db.relationship('Course', backref='semester', lazy='dynamic', cascade='all, delete-orphan')
 
     __table_args__ = (
@@ -72,13 +103,19 @@ class Semester(db.Model):
     )
 
     @property
-    def total_credits(self):
-        return sum(float(course.credits) for course in self.courses.all())
+    def gpa(self):
+        from app.utils import gpa_from_totals
+        return gpa_from_totals(float(self.total_credits or 0), float(self.weighted_points or 0))
 
     @property
-    def gpa(self):
-        from app.utils import calculate_semester_gpa
-        return calculate_semester_gpa(self)
+    def course_count(self):
+        from app.utils import count_semester_courses
+        return count_semester_courses(self)
+
+    @property
+    def cgpa_contribution(self):
+        """Rounded GPA times credits, as rolled up into Student.weighted_points"""
+        return _to_decimal(self.gpa) * _to_decimal(self.total_credits)
 
     def __repr__(self):
         return f'<Semester {self.name}>'
@@ -90,7 +127,7 @@ class Course(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     semester_id = db.Column(db.Integer, db.ForeignKey('semesters.id'), nullable=False, index=True)
     course_name = db.Column(db.String(200), nullable=False)
-    subject_area = db.Column(db.String(100))
+    subject_area = db.Column(db.String(100), index=True)
     course_code = db.Column(db.String(50))
     credits = db.Column(db.Numeric(4, 2), nullable=False)
     marks = db.Column(db.Numeric(5, 2), nullable=False)
@@ -109,3 +146,207 @@ class Course(db.Model):
 
     def __repr__(self):
         return f'<Course {self.course_name}>'
+
+
+class GPASummary(db.Model):
+    """Reporting copy of GPA totals and counts, refreshed by app.summary.
+
+    One row per student (semester_id NULL) and one per semester. data_version
+    is the student's data_version when the row was computed.
+    """
+    __tablename__ = 'student_gpa_summary'
+
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), nullable=False, index=True)
+    semester_id = db.Column(db.Integer, db.ForeignKey('semesters.id', ondelete='CASCADE'), unique=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    total_credits = db.Column(db.Numeric(10, 2), nullable=False)
+    weighted_points = db.Column(db.Numeric(14, 4), nullable=False)
+    gpa = db.Column(db.Numeric(5, 2), nullable=False)
+    semester_count = db.Column(db.Integer)
+    course_count = db.Column(db.Integer, nullable=False)
+    data_version = db.Column(db.Integer, nullable=False)
+    refreshed_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        # max(refreshed_at) per user is part of the dashboard's ETag
+        db.Index('ix_student_gpa_summary_user_refreshed', 'user_id', 'refreshed_at'),
+        db.Index('uq_student_gpa_summary_student', 'student_id', unique=True,
+                 postgresql_where=db.text('semester_id IS NULL'), sqlite_where=db.text('semester_id IS NULL')),
+    )
+
+    def __repr__(self):
+        return f'<GPASummary student={self.student_id} semester={self.semester_id}>'
+
+
+class Job(db.Model):
+    """A background job run by app.jobs; params and result are JSON"""
+    __tablename__ = 'jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    kind = db.Column(db.String(50), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='queued', server_default='queued')
+    params = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    progress = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    total = db.Column(db.Integer)
+    message = db.Column(db.String(255))
+    error = db.Column(db.Text)
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    max_attempts = db.Column(db.Integer, nullable=False, default=3, server_default='3')
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    run_after = db.Column(db.DateTime)
+    worker = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    @property
+    def finished(self):
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    @property
+    def percent(self):
+        """Progress as a percentage, or None when the total is unknown"""
+        if not self.total:
+            return 100 if self.status == 'succeeded' else None
+        return min(100, round(100 * self.progress / self.total))
+
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+
+def _to_decimal(value):
+    if value is None:
+        return Decimal(0)
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def _committed_value(obj, key):
+    """Value of a column attribute as last loaded from the database"""
+    history = inspect(obj).attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+def _semester_of(session, course):
+    # Pending courses created with a bare semester_id don't lazy load
+    return course.semester or session.get(Semester, course.semester_id)
+
+
+def _student_of(session, semester):
+    return semester.student or session.get(Student, semester.student_id)
+
+
+def _course_totals(credits, marks):
+    from app.utils import marks_to_grade_point
+    credits = _to_decimal(credits)
+    return credits, _to_decimal(marks_to_grade_point(_to_decimal(marks))) * credits
+
+
+@event.listens_for(db.session, 'before_flush')
+def _maintain_gpa_totals(session, flush_context, instances):
+    """Apply course inserts, updates and deletes to the stored GPA totals.
+
+    Bulk statements that bypass the unit of work must call
+    app.utils.recompute_gpa_totals for the semesters they touch instead.
+    """
+    deleted_semesters = {obj for obj in session.deleted if isinstance(obj, Semester)}
+    deltas = defaultdict(lambda: [Decimal(0), Decimal(0)])
+
+    def apply(semester, credits, points, sign):
+        if semester is None or semester in deleted_semesters:
+            return
+        deltas[semester][0] += sign * credits
+        deltas[semester][1] += sign * points
+
+    for obj in session.new:
+        if isinstance(obj, Course):
+            apply(_semester_of(session, obj), *_course_totals(obj.credits, obj.marks), 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Course):
+            semester = session.get(Semester, _committed_value(obj, 'semester_id'))
+            credits = _committed_value(obj, 'credits')
+            marks = _committed_value(obj, 'marks')
+            apply(semester, *_course_totals(credits, marks), -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Course) or not session.is_modified(obj):
+            continue
+        old_semester_id = _committed_value(obj, 'semester_id')
+        old_credits = _committed_value(obj, 'credits')
+        old_marks = _committed_value(obj, 'marks')
+        apply(session.get(Semester, old_semester_id), *_course_totals(old_credits, old_marks), -1)
+        apply(_semester_of(session, obj), *_course_totals(obj.credits, obj.marks), 1)
+
+    deltas = {semester: delta for semester, delta in deltas.items() if any(delta)}
+    deleted_students = {semester: session.get(Student, _committed_value(semester, 'student_id'))
+                        for semester in deleted_semesters}
+    students = {semester: _student_of(session, semester) for semester in deltas}
+    # Totals are written back as absolute values, so reload them under a row
+    # lock first: a concurrent course write for the same student waits for
+    # this transaction instead of overwriting its change
+    _lock_totals(session, list(deleted_semesters) + list(deltas))
+    _lock_totals(session, set(deleted_students.values()) | set(students.values()))
+
+    student_deltas = defaultdict(lambda: [Decimal(0), Decimal(0)])
+
+    for semester, student in deleted_students.items():
+        if student is not None and student not in session.deleted:
+            student_deltas[student][0] -= _to_decimal(semester.total_credits)
+            student_deltas[student][1] -= semester.cgpa_contribution
+
+    for semester, (credits, points) in deltas.items():
+        old_credits = _to_decimal(semester.total_credits)
+        old_contribution = semester.cgpa_contribution
+        semester.total_credits = old_credits + credits
+        semester.weighted_points = _to_decimal(semester.weighted_points) + points
+        student = students[semester]
+        if student is not None:
+            student_deltas[student][0] += credits
+            student_deltas[student][1] += semester.cgpa_contribution - old_contribution
+
+    for student, (credits, points) in student_deltas.items():
+        student.total_credits = _to_decimal(student.total_credits) + credits
+        student.weighted_points = _to_decimal(student.weighted_points) + points
+
+
+def _lock_totals(session, objects):
+    """Reload the stored totals of persistent semesters or students with SELECT ... FOR UPDATE"""
+    objects = [obj for obj in objects if obj is not None and inspect(obj).persistent]
+    # A fixed lock order keeps two writers from deadlocking
+    for obj in sorted(objects, key=lambda obj: obj.id):
+        session.refresh(obj, ['total_credits', 'weighted_points'], with_for_update=True)
+
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _queue_user_invalidation(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        session.info.setdefault('changed_users', set()).add(target.id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_cached_users(session):
+    """Drop committed user changes from user_cache; until then other requests keep the old row"""
+    for user_id in session.info.pop('changed_users', ()):
+        user_cache.delete(user_id)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_user_invalidation(session, previous_transaction):
+    session.info.pop('changed_users', None)
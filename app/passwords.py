@@ -0,0 +1,61 @@
+from functools import lru_cache
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+try:
+    import argon2
+except ImportError:  # argon2-cffi is optional
+    argon2 = None
+
+DEFAULT_METHOD = 'pbkdf2:sha256'
+
+
+def get_hash_method():
+    """The configured PASSWORD_HASH_METHOD, or the default outside an app"""
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD)
+    return DEFAULT_METHOD
+
+
+def hash_password(password, method=None):
+    """Hash a password with a Werkzeug method ('pbkdf2:sha256:600000',
+    'scrypt:32768:8:1') or 'argon2:time_cost:memory_kib:parallelism'"""
+    method = method or get_hash_method()
+    if method.startswith('argon2'):
+        return _argon2_hasher(method).hash(password)
+    return generate_password_hash(password, method=method)
+
+
+def verify_password(password_hash, password):
+    if password_hash.startswith('$argon2'):
+        if argon2 is None:
+            raise RuntimeError('This password was hashed with argon2: pip install argon2-cffi')
+        try:
+            return argon2.PasswordHasher().verify(password_hash, password)
+        except argon2.exceptions.VerificationError:
+            return False
+    return check_password_hash(password_hash, password)
+
+
+def needs_rehash(password_hash, method=None):
+    """Whether a stored hash was made with a different method or cost than configured"""
+    method = method or get_hash_method()
+    if method.startswith('argon2'):
+        return not password_hash.startswith('$argon2') or \
+            _argon2_hasher(method).check_needs_rehash(password_hash)
+    return password_hash.split('$', 1)[0] != _werkzeug_prefix(method)
+
+
+@lru_cache(maxsize=8)
+def _werkzeug_prefix(method):
+    # Werkzeug fills in default costs ('scrypt' -> 'scrypt:32768:8:1'); hash once to see them
+    return generate_password_hash('', method=method).split('$', 1)[0]
+
+
+@lru_cache(maxsize=8)
+def _argon2_hasher(method):
+    if argon2 is None:
+        raise RuntimeError('PASSWORD_HASH_METHOD=argon2 needs argon2-cffi: pip install argon2-cffi')
+    params = [int(value) for value in method.split(':')[1:]]
+    names = ['time_cost', 'memory_cost', 'parallelism']
+    return argon2.PasswordHasher(**dict(zip(names, params)))
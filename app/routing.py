@@ -0,0 +1,163 @@
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from functools import wraps
+from threading import Lock
+from flask import g, has_app_context, has_request_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+from sqlalchemy.sql.dml import UpdateBase
+
+logger = logging.getLogger(__name__)
+
+# Bind keys of read replicas in SQLALCHEMY_BINDS start with this
+REPLICA_BIND = 'replica'
+
+# Replication lag query for PostgreSQL standbys, in seconds (0 when caught up)
+PG_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """Picks a healthy read replica for each request, falling back to the primary.
+
+    Replicas are the engines of binds named replica*. Each one is checked
+    with a cheap query at most every REPLICA_HEALTH_INTERVAL seconds (and
+    for replication lag when REPLICA_MAX_LAG is set); a replica that fails
+    the check or drops a connection is skipped until the next check.
+    Requests are spread round-robin over healthy replicas and keep the same
+    one for all their reads.
+
+    After a request writes to the primary, the client reads from the
+    primary for REPLICA_STICKY_SECONDS, so the page a POST redirects to
+    shows the write even if replicas lag behind.
+    """
+
+    def __init__(self):
+        self.health_interval = 30
+        self.max_lag = 0
+        self.sticky_seconds = 5
+        self._state = {}
+        self._lock = Lock()
+        self._counter = itertools.count()
+
+    def init_app(self, app):
+        self.health_interval = app.config.get('REPLICA_HEALTH_INTERVAL', 30)
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', 0)
+        self.sticky_seconds = app.config.get('REPLICA_STICKY_SECONDS', 5)
+
+        db = app.extensions['sqlalchemy']
+        with app.app_context():
+            for key, engine in db.engines.items():
+                if key and key.startswith(REPLICA_BIND):
+                    event.listen(engine, 'handle_error', self._on_error)
+
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+
+    def engine_for_request(self, engines):
+        """The replica engine this request reads from, or None for the primary"""
+        if '_replica_engine' not in g:
+            g._replica_engine = None if g.get('_read_primary') else self._choose(engines)
+        return g._replica_engine
+
+    def _choose(self, engines):
+        replicas = [engine for key, engine in sorted(engines.items(), key=lambda item: str(item[0]))
+                    if key and key.startswith(REPLICA_BIND)]
+        if not replicas:
+            return None
+        start = next(self._counter)
+        for offset in range(len(replicas)):
+            engine = replicas[(start + offset) % len(replicas)]
+            if self._healthy(engine):
+                return engine
+        return None
+
+    def _healthy(self, engine):
+        now = time.monotonic()
+        with self._lock:
+            healthy, checked_at = self._state.get(engine, (True, None))
+            if checked_at is not None and now - checked_at < self.health_interval:
+                return healthy
+            # Claim the check so concurrent requests keep using the last result
+            self._state[engine] = (healthy, now)
+
+        healthy = self._check(engine)
+        with self._lock:
+            self._state[engine] = (healthy, now)
+        return healthy
+
+    def _check(self, engine):
+        try:
+            with engine.connect() as connection:
+                if self.max_lag and connection.dialect.name == 'postgresql':
+                    lag = connection.execute(PG_LAG_QUERY).scalar() or 0
+                    if lag > self.max_lag:
+                        logger.warning('Replica %s is %.1fs behind; reading from the primary',
+                                       engine.url.render_as_string(hide_password=True), lag)
+                        return False
+                else:
+                    connection.execute(text('SELECT 1'))
+            return True
+        except Exception as e:
+            logger.warning('Replica %s failed its health check: %s',
+                           engine.url.render_as_string(hide_password=True), e)
+            return False
+
+    def _on_error(self, context):
+        if context.is_disconnect and context.engine is not None:
+            with self._lock:
+                self._state[context.engine] = (False, time.monotonic())
+
+    def _start_request(self):
+        g._read_primary = session.get('_read_primary_until', 0) > time.time()
+
+    def _finish_request(self, response):
+        if g.get('_primary_write') and self.sticky_seconds:
+            session['_read_primary_until'] = time.time() + self.sticky_seconds
+        return response
+
+
+class RoutingSession(Session):
+    """Session that sends reads to a read replica inside read_replica views.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary,
+    and so does everything when no replica is configured or healthy.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if self._flushing or isinstance(clause, UpdateBase):
+                if has_request_context():
+                    g._primary_write = True
+            elif has_app_context() and g.get('_use_replica', False):
+                engine = replicas.engine_for_request(self._db.engines)
+                if engine is not None:
+                    return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """Route a read-only view's queries to a read replica, if one is configured"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g._use_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def replica_reads():
+    """Route reads in this block to a read replica, e.g. for reports and exports"""
+    previous = g.get('_use_replica', False)
+    g._use_replica = True
+    try:
+        yield
+    finally:
+        g._use_replica = previous
+
+
+replicas = ReplicaRouter()
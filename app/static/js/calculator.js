@@ -1,15 +1,19 @@
 // CGPA Calculator JavaScript
 
+// Grading scale rendered by the server (see grading.py); 10-point fallback
+const gradingScale = window.GRADING_SCALE || {
+    thresholds: [[30, 4], [40, 5], [50, 6], [60, 7], [70, 8], [80, 9], [90, 10]],
+    floor_point: 0
+};
+
 // Grade conversion function (client-side validation)
 function marksToGradePoint(marks) {
-    if (marks >= 90) return 10;
-    if (marks >= 80) return 9;
-    if (marks >= 70) return 8;
-    if (marks >= 60) return 7;
-    if (marks >= 50) return 6;
-    if (marks >= 40) return 5;
-    if (marks >= 30) return 4;
-    return 0;
+    let point = gradingScale.floor_point;
+    for (const [minimum, gradePoint] of gradingScale.thresholds) {
+        if (marks < minimum) break;
+        point = gradePoint;
+    }
+    return point;
 }
 
 // Form validation helpers
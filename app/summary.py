@@ -0,0 +1,194 @@
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import delete, event, func, insert, inspect, or_, select
+from app.models import db, Student, Semester, Course, GPASummary
+from app.utils import gpa_from_totals
+
+logger = logging.getLogger(__name__)
+
+
+class GPASummaryRefresher:
+    """Keeps student_gpa_summary in step with students, semesters and courses.
+
+    Commits that write a student or semester mark the student dirty; a
+    daemon thread refreshes all dirty students every
+    GPA_SUMMARY_REFRESH_INTERVAL seconds (and once more at exit), replacing
+    their rows in one transaction per batch, so readers see either the old
+    rows or the new ones. An interval of 0 refreshes right after each
+    commit instead. Bulk statements that bypass the ORM call mark()
+    themselves; `flask refresh-gpa-summary` catches anything missed.
+    """
+
+    def __init__(self):
+        self.interval = 5
+        self.batch_size = 500
+        self._app = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def init_app(self, app):
+        self.interval = app.config.get('GPA_SUMMARY_REFRESH_INTERVAL', 5)
+        self.batch_size = app.config.get('GPA_SUMMARY_BATCH_SIZE', 500)
+        if self._app is None:
+            atexit.register(self.flush)
+        self._app = app
+
+    def mark(self, student_ids):
+        """Queue students whose summary rows are out of date"""
+        student_ids = set(student_ids)
+        if not student_ids:
+            return
+        if not self.interval:
+            try:
+                self.refresh(student_ids)
+            except Exception:
+                logger.exception('Could not refresh the GPA summary of %d student(s)', len(student_ids))
+            return
+
+        with self._lock:
+            self._pending |= student_ids
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='gpa-summary-refresher', daemon=True)
+                self._thread.start()
+
+    def flush(self):
+        """Refresh all queued students now"""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+        if not pending or self._app is None:
+            return
+        with self._app.app_context():
+            try:
+                self.refresh(pending)
+            except Exception:
+                # Keep them queued for the next round (e.g. a concurrent refresh of the same student)
+                with self._lock:
+                    self._pending |= pending
+                logger.exception('Could not refresh the GPA summary of %d student(s)', len(pending))
+
+    def refresh(self, student_ids):
+        """Recompute the summary rows of these students, one transaction per batch"""
+        student_ids = sorted(student_ids)
+        for start in range(0, len(student_ids), self.batch_size):
+            with db.engine.begin() as connection:
+                _refresh_students(connection, student_ids[start:start + self.batch_size])
+        return len(student_ids)
+
+    def refresh_stale(self):
+        """Refresh students without summary rows or with rows from an older data_version.
+
+        Also deletes rows left by deleted students and semesters; returns
+        (students refreshed, rows deleted).
+        """
+        stale = db.session.scalars(
+            select(Student.id)
+            .outerjoin(GPASummary, (GPASummary.student_id == Student.id) & GPASummary.semester_id.is_(None))
+            .where(or_(GPASummary.id.is_(None), GPASummary.data_version != Student.data_version))
+        ).all()
+        db.session.commit()
+        self.refresh(stale)
+        return len(stale), self._delete_orphans()
+
+    def refresh_all(self, progress=None):
+        """Rebuild every student's rows batch by batch; readers are never blocked.
+
+        The table-based counterpart of REFRESH MATERIALIZED VIEW CONCURRENTLY:
+        each batch replaces its students' rows in its own short transaction
+        instead of locking the whole table while it rebuilds.
+        """
+        student_ids = db.session.scalars(select(Student.id).order_by(Student.id)).all()
+        db.session.commit()
+        for start in range(0, len(student_ids), self.batch_size):
+            self.refresh(student_ids[start:start + self.batch_size])
+            if progress is not None:
+                progress(min(start + self.batch_size, len(student_ids)), len(student_ids))
+        self._delete_orphans()
+        return len(student_ids)
+
+    def _delete_orphans(self):
+        # SQLite does not enforce ON DELETE CASCADE unless foreign keys are switched on
+        with db.engine.begin() as connection:
+            return connection.execute(
+                delete(GPASummary).where(or_(
+                    GPASummary.student_id.not_in(select(Student.id)),
+                    GPASummary.semester_id.not_in(select(Semester.id)),
+                ))
+            ).rowcount
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+def _refresh_students(connection, student_ids):
+    semesters = connection.execute(
+        select(Semester.id, Semester.student_id, Semester.total_credits, Semester.weighted_points,
+               func.count(Course.id))
+        .outerjoin(Course, Course.semester_id == Semester.id)
+        .where(Semester.student_id.in_(student_ids))
+        .group_by(Semester.id, Semester.student_id, Semester.total_credits, Semester.weighted_points)
+    ).all()
+    students = connection.execute(
+        select(Student.id, Student.user_id, Student.total_credits, Student.weighted_points, Student.data_version)
+        .where(Student.id.in_(student_ids))
+    ).all()
+
+    now = datetime.utcnow()
+    owners = {student_id: (user_id, version) for student_id, user_id, _, _, version in students}
+    counts = {student_id: [0, 0] for student_id in owners}
+    rows = []
+    for semester_id, student_id, credits, points, courses in semesters:
+        if student_id not in owners:
+            continue
+        user_id, version = owners[student_id]
+        counts[student_id][0] += 1
+        counts[student_id][1] += courses
+        rows.append({'student_id': student_id, 'semester_id': semester_id, 'user_id': user_id,
+                     'total_credits': credits, 'weighted_points': points,
+                     'gpa': gpa_from_totals(float(credits), float(points)),
+                     'semester_count': None, 'course_count': courses, 'data_version': version, 'refreshed_at': now})
+    for student_id, user_id, credits, points, version in students:
+        semester_count, course_count = counts[student_id]
+        rows.append({'student_id': student_id, 'semester_id': None, 'user_id': user_id,
+                     'total_credits': credits, 'weighted_points': points,
+                     'gpa': gpa_from_totals(float(credits), float(points)),
+                     'semester_count': semester_count, 'course_count': course_count,
+                     'data_version': version, 'refreshed_at': now})
+
+    connection.execute(delete(GPASummary).where(GPASummary.student_id.in_(student_ids)))
+    if rows:
+        connection.execute(insert(GPASummary), rows)
+
+
+@event.listens_for(Student, 'after_insert')
+@event.listens_for(Student, 'after_update')
+@event.listens_for(Student, 'after_delete')
+@event.listens_for(Semester, 'after_insert')
+@event.listens_for(Semester, 'after_update')
+@event.listens_for(Semester, 'after_delete')
+def _queue_summary_refresh(mapper, connection, target):
+    session = inspect(target).session
+    if session is not None:
+        student_id = target.id if isinstance(target, Student) else target.student_id
+        session.info.setdefault('gpa_summary_students', set()).add(student_id)
+
+
+@event.listens_for(db.session, 'after_commit')
+def _mark_committed_students(session):
+    """Hand the students written by this transaction to the refresher, once committed"""
+    student_ids = session.info.pop('gpa_summary_students', None)
+    if student_ids:
+        gpa_summary.mark(student_ids)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_summary_refresh(session, previous_transaction):
+    session.info.pop('gpa_summary_students', None)
+
+
+gpa_summary = GPASummaryRefresher()
@@ -0,0 +1,248 @@
+import csv
+import random
+from decimal import Decimal
+from sqlalchemy import insert
+from app.models import db, User, Student, Semester, Course
+from app.importer import _copy_courses
+from app.passwords import hash_password
+from app.summary import gpa_summary
+from app.utils import get_grading_scale, gpa_from_totals
+
+# Columns of generated CSV files: the import format, which app.py also reads
+CSV_COLUMNS = [
+    'Student ID', 'Student Name', 'Program', 'Year', 'Semester', 'Semester Number',
+    'Course Name', 'Subject Area', 'Course Code', 'Credits', 'Marks',
+]
+
+# Program -> (course code prefix, subject areas its courses are drawn from)
+PROGRAMS = {
+    'Computer Science': ('CS', ['Computer Science', 'Computer Science', 'Mathematics', 'Electronics']),
+    'Electronics': ('EC', ['Electronics', 'Electronics', 'Physics', 'Mathematics']),
+    'Mechanical Engineering': ('ME', ['Mechanical', 'Mechanical', 'Physics', 'Mathematics']),
+    'Mathematics': ('MA', ['Mathematics', 'Mathematics', 'Computer Science', 'Physics']),
+    'Commerce': ('CO', ['Commerce', 'Commerce', 'Economics', 'Humanities']),
+}
+COURSE_TITLES = {
+    'Computer Science': ['Programming', 'Data Structures', 'Algorithms', 'Operating Systems', 'Databases',
+                         'Computer Networks', 'Compilers', 'Software Engineering', 'Machine Learning'],
+    'Mathematics': ['Calculus', 'Linear Algebra', 'Discrete Mathematics', 'Probability', 'Statistics',
+                    'Numerical Methods', 'Real Analysis'],
+    'Electronics': ['Circuit Theory', 'Digital Logic', 'Signals and Systems', 'Microprocessors',
+                    'Analog Electronics', 'Communication Systems'],
+    'Physics': ['Mechanics', 'Electromagnetism', 'Optics', 'Thermodynamics', 'Modern Physics'],
+    'Mechanical': ['Engineering Drawing', 'Fluid Mechanics', 'Strength of Materials', 'Machine Design',
+                   'Heat Transfer', 'Manufacturing'],
+    'Commerce': ['Financial Accounting', 'Business Law', 'Cost Accounting', 'Auditing', 'Taxation'],
+    'Economics': ['Microeconomics', 'Macroeconomics', 'Econometrics'],
+    'Humanities': ['Technical Writing', 'Professional Ethics', 'Environmental Studies'],
+}
+# Harder subjects pull marks down, by this many points on average
+SUBJECT_DIFFICULTY = {'Mathematics': -4, 'Physics': -3, 'Electronics': -2, 'Humanities': 4, 'Commerce': 2}
+FIRST_NAMES = ['Aarav', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Nikhil', 'Priya', 'Rahul',
+               'Rohan', 'Saanvi', 'Sneha', 'Tara', 'Varun', 'Vikram', 'Zara', 'Aditi', 'Karthik', 'Lakshmi']
+LAST_NAMES = ['Sharma', 'Iyer', 'Patel', 'Reddy', 'Nair', 'Gupta', 'Menon', 'Rao', 'Singh', 'Das',
+              'Kumar', 'Pillai', 'Joshi', 'Bose', 'Anand']
+CREDITS = [1, 2, 3, 3, 3, 4, 4]
+BASE_YEAR = 2024
+
+
+class SyntheticDataset:
+    """Deterministic synthetic users, students, semesters and courses.
+
+    Each student is generated from its own seeded RNG, so a given seed
+    always yields the same data however it is batched or written. Students
+    in year Y have completed 2(Y-1) or 2(Y-1)+1 semesters of 4-7 courses,
+    and marks come from a per-student ability plus per-subject difficulty
+    and noise, clipped to 0-100.
+    """
+
+    def __init__(self, users=1, students_per_user=100, seed=0, prefix='SYN'):
+        self.user_count = users
+        self.students_per_user = students_per_user
+        self.seed = seed
+        self.prefix = prefix
+
+    def users(self):
+        """Yield (index, username, email) for each generated user"""
+        for index in range(self.user_count):
+            username = f'{self.prefix.lower()}{index:04d}'
+            yield index, username, f'{username}@example.com'
+
+    def students(self, user_index):
+        """Yield the students of one user, each with nested semesters and courses"""
+        for index in range(self.students_per_user):
+            yield self._student(user_index, index)
+
+    def _student(self, user_index, index):
+        number = user_index * self.students_per_user + index
+        rng = random.Random(self.seed * 1_000_003 + number)
+        program = rng.choice(list(PROGRAMS))
+        prefix, areas = PROGRAMS[program]
+        year = rng.randint(1, 4)
+        ability = rng.gauss(68, 10)
+
+        semesters = []
+        for semester_number in range(1, 2 * (year - 1) + rng.randint(1, 2) + 1):
+            courses = []
+            for k in range(rng.randint(4, 7)):
+                area = rng.choice(areas)
+                marks = rng.gauss(ability + SUBJECT_DIFFICULTY.get(area, 0), 9)
+                courses.append({
+                    'course_name': rng.choice(COURSE_TITLES[area]),
+                    'subject_area': area,
+                    'course_code': f'{prefix}{semester_number}{k + 1:02d}',
+                    'credits': rng.choice(CREDITS),
+                    'marks': min(100, max(0, round(marks))),
+                })
+            semesters.append({
+                'name': f'Semester {semester_number}',
+                'semester_number': semester_number,
+                'year': BASE_YEAR - year + 1 + (semester_number - 1) // 2,
+                'courses': courses,
+            })
+
+        return {
+            'student_id': f'{self.prefix}{number:08d}',
+            'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            'email': f'{self.prefix.lower()}{number:08d}@students.example.com',
+            'program': program,
+            'year': year,
+            'semesters': semesters,
+        }
+
+    def csv_rows(self):
+        """Yield one CSV_COLUMNS list per course, for every user's students"""
+        for user_index, _, _ in self.users():
+            for student in self.students(user_index):
+                for semester in student['semesters']:
+                    for course in semester['courses']:
+                        yield [student['student_id'], student['name'], student['program'], student['year'],
+                               semester['name'], semester['semester_number'], course['course_name'],
+                               course['subject_area'], course['course_code'], course['credits'], course['marks']]
+
+
+def write_csv(dataset, file):
+    """Write a dataset to an open text file in the import CSV format; returns the row count"""
+    writer = csv.writer(file, lineterminator='\n')
+    writer.writerow(CSV_COLUMNS)
+    count = 0
+    batch = []
+    for row in dataset.csv_rows():
+        batch.append(row)
+        if len(batch) >= 10000:
+            writer.writerows(batch)
+            count += len(batch)
+            batch = []
+    writer.writerows(batch)
+    return count + len(batch)
+
+
+def write_parquet(dataset, path, batch_size=100000):
+    """Write a dataset to a Parquet file in row groups; needs pyarrow"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('Parquet output needs pyarrow: pip install pyarrow')
+
+    schema = pa.schema([
+        ('Student ID', pa.string()), ('Student Name', pa.string()), ('Program', pa.string()),
+        ('Year', pa.int16()), ('Semester', pa.string()), ('Semester Number', pa.int16()),
+        ('Course Name', pa.string()), ('Subject Area', pa.string()), ('Course Code', pa.string()),
+        ('Credits', pa.float32()), ('Marks', pa.float32()),
+    ])
+
+    def table(rows):
+        columns = [pa.array(values, type=field.type) for field, values in zip(schema, zip(*rows))]
+        return pa.Table.from_arrays(columns, schema=schema)
+
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        batch = []
+        for row in dataset.csv_rows():
+            batch.append(row)
+            if len(batch) >= batch_size:
+                writer.write_table(table(batch))
+                count += len(batch)
+                batch = []
+        if batch:
+            writer.write_table(table(batch))
+            count += len(batch)
+    return count
+
+
+def write_database(dataset, batch_size=1000, password='password', use_copy=True):
+    """Insert a dataset with multi-row INSERTs (COPY for courses on PostgreSQL).
+
+    GPA totals are computed while generating, the same way
+    recompute_gpa_totals does, so no recompute pass is needed. Commits each
+    user, then once per batch of students; returns counts of the rows written.
+    """
+    counts = dict.fromkeys(['users', 'students', 'semesters', 'courses'], 0)
+    grade_point = get_grading_scale().grade_point
+    password_hash = hash_password(password)
+
+    for user_index, username, email in dataset.users():
+        if User.query.filter_by(username=username).first() is not None:
+            raise ValueError(f"User '{username}' already exists; use another prefix")
+        user_id = db.session.scalar(
+            insert(User).values(username=username, email=email, password_hash=password_hash).returning(User.id))
+        db.session.commit()
+        counts['users'] += 1
+
+        batch = []
+        for student in dataset.students(user_index):
+            batch.append(student)
+            if len(batch) >= batch_size:
+                _insert_students(user_id, batch, grade_point, use_copy, counts)
+                batch = []
+        if batch:
+            _insert_students(user_id, batch, grade_point, use_copy, counts)
+    return counts
+
+
+def _insert_students(user_id, students, grade_point, use_copy, counts):
+    cents = Decimal('0.01')
+    student_rows = []
+    semester_rows = []
+    for student in students:
+        student_credits = Decimal(0)
+        student_points = Decimal(0)
+        for semester in student['semesters']:
+            credits = Decimal(sum(course['credits'] for course in semester['courses'])).quantize(cents)
+            points = Decimal(str(float(sum(grade_point(course['marks']) * course['credits']
+                                           for course in semester['courses'])))).quantize(cents)
+            semester_rows.append({'name': semester['name'], 'semester_number': semester['semester_number'],
+                                  'year': semester['year'], 'total_credits': credits, 'weighted_points': points})
+            student_credits += credits
+            student_points += Decimal(str(gpa_from_totals(float(credits), float(points)))) * credits
+        student_rows.append({'user_id': user_id, 'student_id': student['student_id'], 'name': student['name'],
+                             'email': student['email'], 'program': student['program'], 'year': student['year'],
+                             'total_credits': student_credits, 'weighted_points': student_points})
+
+    student_ids = db.session.scalars(
+        insert(Student).returning(Student.id, sort_by_parameter_order=True), student_rows).all()
+
+    semester_rows_iter = iter(semester_rows)
+    for student, student_id in zip(students, student_ids):
+        for _ in student['semesters']:
+            next(semester_rows_iter)['student_id'] = student_id
+    semester_ids = db.session.scalars(
+        insert(Semester).returning(Semester.id, sort_by_parameter_order=True), semester_rows).all() \
+        if semester_rows else []
+
+    course_rows = []
+    semester_id_iter = iter(semester_ids)
+    for student in students:
+        for semester in student['semesters']:
+            semester_id = next(semester_id_iter)
+            for course in semester['courses']:
+                course_rows.append(dict(course, semester_id=semester_id))
+    if course_rows and not (use_copy and _copy_courses(course_rows)):
+        db.session.execute(insert(Course), course_rows)
+    db.session.commit()
+    gpa_summary.mark(student_ids)
+
+    counts['students'] += len(student_rows)
+    counts['semesters'] += len(semester_rows)
+    counts['courses'] += len(course_rows)
@@ -0,0 +1,118 @@
+import csv
+import os
+from contextlib import suppress
+from flask import current_app
+from sqlalchemy import select, update
+from app.models import db, User, Student
+from app.jobs import jobs, JobFailed, JobCancelled
+from app.utils import recompute_gpa_totals
+from app.importer import import_courses, CourseImportError
+from app.exporter import export_rows, stream_export, EXPORT_FORMATS
+from app.routing import replica_reads
+from app.summary import gpa_summary
+
+
+@jobs.task('recompute-gpa-totals')
+def recompute_gpa_totals_task(ctx):
+    """Recompute stored GPA totals (of one user's students, or all), e.g. after changing GRADING_SCALE"""
+    query = select(Student.id).order_by(Student.id)
+    if ctx.user_id is not None:
+        query = query.where(Student.user_id == ctx.user_id)
+    student_ids = db.session.scalars(query).all()
+    chunk_size = int(ctx.params.get('chunk_size', 500))
+
+    fixed = 0
+    ctx.progress(0, len(student_ids))
+    for start in range(0, len(student_ids), chunk_size):
+        chunk = student_ids[start:start + chunk_size]
+        drift = recompute_gpa_totals(student_ids=chunk)
+        if drift:
+            db.session.execute(update(Student).where(Student.id.in_(chunk))
+                               .values(data_version=Student.data_version + 1))
+        db.session.commit()
+        if drift:
+            gpa_summary.mark(chunk)
+        fixed += len(drift)
+        ctx.progress(start + len(chunk), len(student_ids), f'{fixed} drifted row(s) fixed')
+    return {'students': len(student_ids), 'rows_fixed': fixed}
+
+
+@jobs.task('refresh-gpa-summary')
+def refresh_gpa_summary_task(ctx):
+    """Rebuild student_gpa_summary for every student, batch by batch"""
+    students = gpa_summary.refresh_all(progress=lambda done, total: ctx.progress(done, total))
+    return {'students': students}
+
+
+@jobs.task('import-courses')
+def import_courses_task(ctx):
+    """Import an uploaded CSV file; re-running it after a failure updates rows already imported.
+
+    The upload is kept while retries are left and removed once the job
+    succeeds or fails for good; a cancelled import keeps it so Retry can
+    resume, and `flask jobs prune` removes it later.
+    """
+    path = jobs.file_path(ctx.params['file'])
+    remove_upload = False
+    try:
+        user = db.session.get(User, ctx.user_id)
+        if user is None:
+            raise JobFailed('The importing user no longer exists')
+        if not os.path.exists(path):
+            raise JobFailed('The uploaded file is no longer available; upload it again')
+
+        with open(path, encoding='utf-8-sig', newline='') as file:
+            total = max(sum(1 for _ in csv.reader(file)) - 1, 0)
+            file.seek(0)
+            ctx.progress(0, total)
+            try:
+                counts = import_courses(file, user,
+                                        batch_size=current_app.config['IMPORT_BATCH_SIZE'],
+                                        use_copy=current_app.config['IMPORT_USE_COPY'],
+                                        progress=lambda rows: ctx.progress(rows, total))
+            except CourseImportError as e:
+                raise JobFailed(f'Import failed: {e}')
+        remove_upload = True
+        return counts
+    except JobCancelled:
+        raise
+    except JobFailed:
+        remove_upload = True
+        raise
+    except Exception:
+        remove_upload = ctx.attempts >= ctx.max_attempts
+        raise
+    finally:
+        if remove_upload and os.path.exists(path):
+            os.remove(path)
+
+
+@jobs.task('export')
+def export_task(ctx):
+    """Write a user's export to JOB_STORAGE_DIR; the result names the file"""
+    fmt = ctx.params.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        raise JobFailed(f"Unsupported export format '{fmt}'")
+
+    name = f'export-{ctx.job_id}.{fmt}'
+    path = jobs.file_path(name)
+    rows = 0
+
+    def counted(export):
+        nonlocal rows
+        for row in export:
+            rows += 1
+            yield row
+
+    try:
+        with replica_reads(), open(path + '.part', 'w', encoding='utf-8', newline='') as output:
+            for chunk in stream_export(counted(export_rows(ctx.user_id)), fmt):
+                output.write(chunk)
+                ctx.progress(rows, message=f'{rows} row(s) written')
+    except Exception:
+        # open() may have failed before creating the file; keep the original error
+        with suppress(FileNotFoundError):
+            os.remove(path + '.part')
+        raise
+    os.replace(path + '.part', path)
+    return {'file': name, 'format': fmt, 'rows': rows}
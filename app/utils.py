@@ -1,64 +1,154 @@
+from decimal import Decimal
+from flask import current_app, has_app_context
+from sqlalchemy import case, func
+from app.cache import gpa_cache
+from grading import TEN_POINT
+
+
+def get_grading_scale():
+    """The configured GradingScale, or the 10-point scale outside an app"""
+    if has_app_context():
+        return current_app.extensions.get('grading_scale', TEN_POINT)
+    return TEN_POINT
+
+
 def marks_to_grade_point(marks):
-    """Convert marks (0-100) to grade point (10-point scale)"""
-    if marks >= 90:
-        return 10
-    elif marks >= 80:
-        return 9
-    elif marks >= 70:
-        return 8
-    elif marks >= 60:
-        return 7
-    elif marks >= 50:
-        return 6
-    elif marks >= 40:
-        return 5
-    elif marks >= 30:
-        return 4
-    else:
-        return 0
-
-
-def calculate_semester_gpa(semester):
-    """Calculate GPA for a single semester"""
-    courses = semester.courses.all()
-
-    if not courses:
-        return 0.0
+    """Convert marks (0-100) to a grade point on the configured scale"""
+    return get_grading_scale().grade_point(marks)
 
-    total_credits = 0
-    weighted_grade_points = 0
 
-    for course in courses:
-        credits = float(course.credits)
-        grade_point = course.grade_point
-        total_credits += credits
-        weighted_grade_points += (grade_point * credits)
+def grade_point_expression(marks, scale=None):
+    """SQL CASE expression mirroring marks_to_grade_point for a marks column"""
+    scale = scale or get_grading_scale()
+    whens = [
+        (marks >= minimum, point)
+        for minimum, point in zip(reversed(scale.minimums), reversed(scale.points[1:]))
+    ]
+    return case(*whens, else_=scale.points[0])
+
+
+def semester_aggregates(student_ids=None, semester_ids=None):
+    """Aggregate credits and weighted grade points per semester in one query.
+
+    Returns a list of plain (student_id, semester_id, total_credits,
+    weighted_grade_points, course_count) tuples. Semesters without courses
+    are not included.
+    """
+    from app.models import db, Semester, Course
+
+    query = db.session.query(
+        Semester.student_id,
+        Course.semester_id,
+        func.sum(Course.credits),
+        func.sum(grade_point_expression(Course.marks) * Course.credits),
+        func.count(Course.id)
+    ).join(Semester, Semester.id == Course.semester_id)
 
+    if student_ids is not None:
+        query = query.filter(Semester.student_id.in_(student_ids))
+    if semester_ids is not None:
+        query = query.filter(Course.semester_id.in_(semester_ids))
+
+    query = query.group_by(Semester.student_id, Course.semester_id)
+
+    return [
+        (student_id, semester_id, float(credits or 0), float(points or 0), count)
+        for student_id, semester_id, credits, points, count in query
+    ]
+
+
+def gpa_from_totals(total_credits, weighted_grade_points):
+    """GPA from credit and weighted grade point totals"""
     if total_credits == 0:
         return 0.0
-
     return round(weighted_grade_points / total_credits, 2)
 
 
-def calculate_overall_cgpa(student):
-    """Calculate overall CGPA across all semesters for a student"""
-    semesters = student.semesters.all()
+def _student_cache_key(student):
+    return (student.id, student.data_version or 0)
+
+
+@gpa_cache.memoize(_student_cache_key)
+def student_semester_summaries(student):
+    """Map semester id -> (gpa, total_credits, course_count) for a student"""
+    return {
+        semester_id: (gpa_from_totals(credits, points), credits, count)
+        for _, semester_id, credits, points, count in semester_aggregates(student_ids=[student.id])
+    }
 
-    if not semesters:
-        return 0.0
 
+def semester_summary(semester):
+    """(gpa, total_credits, course_count) for a semester, served from the student's summaries"""
+    return student_semester_summaries(semester.student).get(semester.id, (0.0, 0.0, 0))
+
+
+def count_semester_courses(semester):
+    """Number of courses in a semester"""
+    return semester_summary(semester)[2]
+
+
+@gpa_cache.memoize(_student_cache_key)
+def calculate_overall_cgpa(student):
+    """Calculate overall CGPA across all semesters for a student"""
     total_credits = 0
     weighted_gpa = 0
 
-    for semester in semesters:
-        semester_credits = semester.total_credits
-        semester_gpa = semester.gpa
-
+    for semester_gpa, semester_credits, _ in student_semester_summaries(student).values():
         if semester_credits > 0:
             total_credits += semester_credits
             weighted_gpa += (semester_gpa * semester_credits)
 
-    if total_credits == 0:
-        return 0.0
+    return gpa_from_totals(total_credits, weighted_gpa)
+
+
+def recompute_gpa_totals(student_ids=None, fix=True):
+    """Recompute stored semester and student GPA totals from the course table.
+
+    Returns a list of (kind, id, stored, expected) tuples for every row whose
+    stored (total_credits, weighted_points) drifted. With fix=True the stored
+    values are overwritten; the caller is responsible for committing.
+    """
+    from app.models import Student, Semester
+
+    cents = Decimal('0.01')
+    semester_totals = {}
+    for _, semester_id, credits, points, _ in semester_aggregates(student_ids=student_ids):
+        semester_totals[semester_id] = (
+            Decimal(str(credits)).quantize(cents),
+            Decimal(str(points)).quantize(cents)
+        )
+
+    students = Student.query
+    if student_ids is not None:
+        students = students.filter(Student.id.in_(student_ids))
+    students = students.all()
+    student_totals = {student.id: [Decimal(0), Decimal(0)] for student in students}
+
+    semesters = Semester.query
+    if student_ids is not None:
+        semesters = semesters.filter(Semester.student_id.in_(student_ids))
+
+    drift = []
+    for semester in semesters:
+        expected = semester_totals.get(semester.id, (Decimal(0), Decimal(0)))
+        stored = (Decimal(semester.total_credits or 0), Decimal(semester.weighted_points or 0))
+        if stored != expected:
+            drift.append(('semester', semester.id, stored, expected))
+            if fix:
+                semester.total_credits, semester.weighted_points = expected
+
+        credits, points = expected
+        if credits > 0:
+            gpa = gpa_from_totals(float(credits), float(points))
+            student_totals[semester.student_id][0] += credits
+            student_totals[semester.student_id][1] += Decimal(str(gpa)) * credits
+
+    for student in students:
+        expected = tuple(student_totals[student.id])
+        stored = (Decimal(student.total_credits or 0), Decimal(student.weighted_points or 0))
+        if stored != expected:
+            drift.append(('student', student.id, stored, expected))
+            if fix:
+                student.total_credits, student.weighted_points = expected
 
-    return round(weighted_gpa / total_credits, 2)
+    return drift
@@ -0,0 +1,255 @@
+"""Benchmarks for GPA computation, page rendering and CSV throughput.
+
+Seeds a throwaway database with app.synthetic students at one or more scales,
+then times calculate_overall_cgpa, the dashboard/view_student/view_semester
+pages through the Flask test client, and app.py's calculate_cgpa on a
+generated CSV. Results are written as JSON and compared against a stored
+baseline; any regression makes the run exit non-zero.
+
+    python benchmarks/bench.py                          # 10 and 1k students, SQLite
+    python benchmarks/bench.py --scales 10,1000,100000 -o results.json
+    python benchmarks/bench.py --database-url postgresql+psycopg://localhost/cgpa_bench
+    python benchmarks/bench.py --update-baseline        # accept the current numbers
+"""
+import argparse
+import importlib.util
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DEFAULT_BASELINE = os.path.join(ROOT, 'benchmarks', 'baseline.json')
+
+
+def percentiles(samples):
+    """p50/p95/p99 of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99),
+            'mean': round(statistics.fmean(ordered) * 1000, 3)}
+
+
+class QueryCounter:
+    """Counts SQL statements executed on an engine between reset() calls"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
+
+
+def load_cli():
+    """Import app.py, which the app package shadows as a module name"""
+    spec = importlib.util.spec_from_file_location('cgpa_cli', os.path.join(ROOT, 'app.py'))
+    cli = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(cli)
+    return cli
+
+
+def timed(func, iterations):
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_scale(app, counter, scale, args, tmpdir):
+    """Run every benchmark against a freshly seeded database of scale students"""
+    from app.cache import gpa_cache
+    from app.models import db, User, Student, Semester
+    from app.summary import gpa_summary
+    from app.synthetic import SyntheticDataset, write_csv, write_database
+    from app.utils import calculate_overall_cgpa
+
+    rng = random.Random(args.seed)
+    dataset = SyntheticDataset(users=1, students_per_user=scale, seed=args.seed, prefix='BENCH')
+    results = {}
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        started = time.perf_counter()
+        write_database(dataset, batch_size=5000)
+        results['seed_seconds'] = round(time.perf_counter() - started, 3)
+        # Fill student_gpa_summary now rather than from the background refresher mid-benchmark
+        gpa_summary.flush()
+
+        student_ids = db.session.scalars(db.select(Student.id)).all()
+        semester_ids = db.session.scalars(db.select(Semester.id)).all()
+        user_id = db.session.scalar(db.select(User.id))
+
+    sample_students = [rng.choice(student_ids) for _ in range(args.iterations)]
+    sample_semesters = [rng.choice(semester_ids) for _ in range(args.iterations)]
+
+    # calculate_overall_cgpa, with an empty cache (cold) and a primed one (warm)
+    def overall(student_id, clear):
+        with app.app_context():
+            if clear:
+                gpa_cache.store.clear()
+            calculate_overall_cgpa(db.session.get(Student, student_id))
+
+    for label, clear in (('calculate_overall_cgpa_cold', True), ('calculate_overall_cgpa_warm', False)):
+        if not clear:
+            for student_id in sample_students:
+                overall(student_id, False)
+        students = iter(sample_students)
+        counter.reset()
+        samples = timed(lambda: overall(next(students), clear), args.iterations)
+        results[label] = dict(percentiles(samples), queries=round(counter.count / args.iterations, 2))
+
+    # Pages through the test client, logged in as the owning user
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    pages = {
+        'dashboard': lambda n: '/dashboard',
+        'view_student': lambda n: f'/students/{sample_students[n]}',
+        'view_semester': lambda n: f'/semesters/{sample_semesters[n]}',
+    }
+    for name, url in pages.items():
+        client.get(url(0))  # compile templates outside the timed loop
+        samples, queries = [], []
+        for n in range(args.iterations):
+            gpa_cache.store.clear()
+            counter.reset()
+            started = time.perf_counter()
+            response = client.get(url(n))
+            samples.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url(n)} returned {response.status_code}')
+            queries.append(counter.count)
+        results[name] = dict(percentiles(samples), queries=max(queries))
+
+    # app.py calculate_cgpa throughput on the same dataset as a CSV file
+    cli = load_cli()
+    csv_path = os.path.join(tmpdir, 'courses.csv')
+    with open(csv_path, 'w', newline='') as file:
+        rows = write_csv(dataset, file)
+    samples = timed(lambda: cli.calculate_cgpa(csv_path, quiet=True, out=io.StringIO()), args.csv_runs)
+    results['calculate_cgpa_csv'] = dict(percentiles(samples), rows=rows,
+                                         rows_per_sec=round(rows / statistics.median(samples)))
+
+    with app.app_context():
+        db.drop_all()
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Regressions of results against baseline: slower p50, lower throughput or more queries"""
+    regressions = []
+    for scale, benchmarks in results.items():
+        for name, current in benchmarks.items():
+            previous = baseline.get(scale, {}).get(name)
+            if not isinstance(current, dict) or not previous:
+                continue
+            if 'queries' in previous and current['queries'] > previous['queries']:
+                regressions.append(f"{scale}/{name}: {current['queries']} queries (baseline {previous['queries']})")
+            if 'rows_per_sec' not in previous and current['p50'] > previous['p50'] * (1 + tolerance) \
+                    and current['p50'] - previous['p50'] > min_delta:
+                regressions.append(f"{scale}/{name}: p50 {current['p50']}ms (baseline {previous['p50']}ms)")
+            if 'rows_per_sec' in previous and current['rows_per_sec'] < previous['rows_per_sec'] * (1 - tolerance):
+                regressions.append(f"{scale}/{name}: {current['rows_per_sec']} rows/s "
+                                   f"(baseline {previous['rows_per_sec']} rows/s)")
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark GPA computation, pages and CSV throughput.')
+    parser.add_argument('--scales', default='10,1000',
+                        help='comma-separated numbers of students to seed (default: 10,1000)')
+    parser.add_argument('--iterations', type=int, default=50, help='timed calls per benchmark (default: 50)')
+    parser.add_argument('--csv-runs', type=int, default=5, help='timed calculate_cgpa runs (default: 5)')
+    parser.add_argument('--seed', type=int, default=42, help='random seed for the synthetic data')
+    parser.add_argument('--database-url',
+                        help='throwaway database to use instead of a temporary SQLite file; '
+                             'its tables are dropped and recreated')
+    parser.add_argument('-o', '--output', help='write results JSON to this file')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline JSON to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed p50/throughput slowdown before failing (default: 0.5)')
+    parser.add_argument('--min-delta', type=float, default=1.0,
+                        help='ignore p50 slowdowns smaller than this many milliseconds (default: 1.0)')
+    parser.add_argument('--update-baseline', action='store_true', help='overwrite the baseline with these results')
+    args = parser.parse_args(argv)
+    try:
+        args.scales = [int(scale) for scale in args.scales.split(',')]
+    except ValueError:
+        parser.error('--scales must be a comma-separated list of integers')
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    tmpdir = tempfile.mkdtemp(prefix='cgpa-bench-')
+    # Read by config.py on import, so set before the app is imported
+    os.environ['DATABASE_URL'] = args.database_url or f'sqlite:///{os.path.join(tmpdir, "bench.db")}'
+    os.environ['INSTRUMENTATION_ENABLED'] = 'false'
+    from app import create_app
+    from app.models import db
+
+    app = create_app('production')
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    results = {str(scale): bench_scale(app, counter, scale, args, tmpdir) for scale in args.scales}
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': (args.database_url or 'sqlite').split(':')[0],
+        'results': results,
+    }
+
+    for scale, benchmarks in results.items():
+        print(f'\n{scale} students (seeded in {benchmarks["seed_seconds"]}s)')
+        for name, values in benchmarks.items():
+            if isinstance(values, dict):
+                extra = f"{values['rows_per_sec']} rows/s" if 'rows_per_sec' in values else f"{values['queries']} queries"
+                print(f"  {name:<30} p50 {values['p50']:>9.3f}ms  p95 {values['p95']:>9.3f}ms  "
+                      f"p99 {values['p99']:>9.3f}ms  {extra}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f'\nBaseline written to {args.baseline}')
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f'\nNo baseline at {args.baseline}; run with --update-baseline to create one')
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    regressions = compare(results, baseline.get('results', {}), args.tolerance, args.min_delta)
+    if regressions:
+        print('\nREGRESSIONS against baseline:', file=sys.stderr)
+        for regression in regressions:
+            print(f'  {regression}', file=sys.stderr)
+        return 1
+    print('\nNo regressions against baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Table-driven grading scales shared by the web app and the app.py CLI.
+
+A scale is a sorted table of (minimum marks, grade point, label) rows plus
+the grade point awarded below the lowest threshold. Scalar lookups use
+bisect; batch lookups use numpy.searchsorted when NumPy is installed and
+fall back to the scalar path otherwise.
+"""
+import json
+import os
+from bisect import bisect_right
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; batch methods fall back to bisect
+    np = None
+
+
+class GradingScale:
+    def __init__(self, name, thresholds, floor_point=0, floor_label='F'):
+        """thresholds: iterable of (min_marks, grade_point) or (min_marks, grade_point, label)"""
+        rows = sorted((tuple(row) + (None,))[:3] for row in thresholds)
+        if not rows:
+            raise ValueError('A grading scale needs at least one threshold')
+
+        self.name = name
+        self.minimums = [float(row[0]) for row in rows]
+        # points[i] / labels[i] apply to marks with bisect_right(minimums, marks) == i
+        self.points = [floor_point] + [row[1] for row in rows]
+        self.labels = [floor_label] + [row[2] for row in rows]
+        self._np_minimums = None
+        self._np_points = None
+
+    @property
+    def max_point(self):
+        return max(self.points)
+
+    def grade_point(self, marks):
+        """Grade point for a single mark"""
+        return self.points[bisect_right(self.minimums, marks)]
+
+    def label(self, marks):
+        """Letter/label for a single mark, or None if the scale has no labels"""
+        return self.labels[bisect_right(self.minimums, marks)]
+
+    def grade_points(self, marks):
+        """Grade points for a sequence of marks (a NumPy array when NumPy is available)"""
+        if np is None:
+            return [self.grade_point(mark) for mark in marks]
+        if self._np_minimums is None:
+            self._np_minimums = np.asarray(self.minimums, dtype=float)
+            self._np_points = np.asarray(self.points, dtype=float)
+        indexes = np.searchsorted(self._np_minimums, np.asarray(marks, dtype=float), side='right')
+        return self._np_points[indexes]
+
+    def weighted_totals(self, credits, marks):
+        """(total_credits, weighted_grade_points) for parallel credit/mark sequences"""
+        if np is None:
+            total_credits = 0.0
+            weighted = 0.0
+            for credit, mark in zip(credits, marks):
+                total_credits += credit
+                weighted += self.grade_point(mark) * credit
+            return total_credits, weighted
+
+        credits = np.asarray(credits, dtype=float)
+        return float(credits.sum()), float(np.dot(self.grade_points(marks), credits))
+
+    def weighted_gpa(self, credits, marks):
+        """Credit-weighted GPA, rounded to two places; 0.0 when there are no credits"""
+        total_credits, weighted = self.weighted_totals(credits, marks)
+        if total_credits == 0:
+            return 0.0
+        return round(weighted / total_credits, 2)
+
+    def rows(self):
+        """(min_marks, max_marks, grade_point, label) from the highest band down"""
+        bounds = [0.0] + self.minimums
+        rows = []
+        for i in range(len(self.points) - 1, -1, -1):
+            upper = self.minimums[i] if i < len(self.minimums) else None
+            rows.append((bounds[i], upper, self.points[i], self.labels[i]))
+        return rows
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'thresholds': [
+                [minimum, point, label]
+                for minimum, point, label in zip(self.minimums, self.points[1:], self.labels[1:])
+            ],
+            'floor_point': self.points[0],
+            'floor_label': self.labels[0],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['name'], data['thresholds'],
+                   floor_point=data.get('floor_point', 0),
+                   floor_label=data.get('floor_label', 'F'))
+
+    def __repr__(self):
+        return f'<GradingScale {self.name}>'
+
+
+TEN_POINT = GradingScale('10-point', [
+    (90, 10, 'O'),
+    (80, 9, 'A+'),
+    (70, 8, 'A'),
+    (60, 7, 'B+'),
+    (50, 6, 'B'),
+    (40, 5, 'C'),
+    (30, 4, 'P'),
+])
+
+FOUR_POINT = GradingScale('4.0', [
+    (90, 4.0, 'A'),
+    (80, 3.0, 'B'),
+    (70, 2.0, 'C'),
+    (60, 1.0, 'D'),
+], floor_point=0.0)
+
+SCALES = {scale.name: scale for scale in (TEN_POINT, FOUR_POINT)}
+
+
+def get_scale(name_or_path=None):
+    """Look up a built-in scale by name, or load one from a JSON file path"""
+    if not name_or_path:
+        return TEN_POINT
+    if name_or_path in SCALES:
+        return SCALES[name_or_path]
+    if os.path.exists(name_or_path):
+        with open(name_or_path) as file:
+            return GradingScale.from_dict(json.load(file))
+    raise ValueError(f"Unknown grading scale '{name_or_path}'. "
+                     f"Use one of {', '.join(SCALES)} or a path to a JSON scale file.")
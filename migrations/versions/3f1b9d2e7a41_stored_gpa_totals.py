@@ -0,0 +1,90 @@
+"""Stored GPA totals on semesters and students
+
+Revision ID: 3f1b9d2e7a41
+Revises: c8a68ad7d15f
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from collections import defaultdict
+from decimal import Decimal
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1b9d2e7a41'
+down_revision = 'c8a68ad7d15f'
+branch_labels = None
+depends_on = None
+
+
+def _grade_point(marks):
+    thresholds = ((90, 10), (80, 9), (70, 8), (60, 7), (50, 6), (40, 5), (30, 4))
+    for minimum, grade_point in thresholds:
+        if marks >= minimum:
+            return grade_point
+    return 0
+
+
+def upgrade():
+    with op.batch_alter_table('semesters', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_credits', sa.Numeric(precision=8, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('weighted_points', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('total_credits', sa.Numeric(precision=10, scale=2), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('weighted_points', sa.Numeric(precision=14, scale=4), server_default='0', nullable=False))
+
+    # Backfill from existing courses. Rounding of semester GPAs follows
+    # app.utils.gpa_from_totals so the stored rollups match the live values.
+    bind = op.get_bind()
+    semesters = sa.table('semesters',
+        sa.column('id', sa.Integer), sa.column('student_id', sa.Integer),
+        sa.column('total_credits', sa.Numeric), sa.column('weighted_points', sa.Numeric))
+    students = sa.table('students',
+        sa.column('id', sa.Integer),
+        sa.column('total_credits', sa.Numeric), sa.column('weighted_points', sa.Numeric))
+    courses = sa.table('courses',
+        sa.column('semester_id', sa.Integer),
+        sa.column('credits', sa.Numeric), sa.column('marks', sa.Numeric))
+
+    semester_totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    rows = bind.execute(sa.select(courses.c.semester_id, courses.c.credits, courses.c.marks))
+    for semester_id, credits, marks in rows:
+        credits = Decimal(str(credits))
+        semester_totals[semester_id][0] += credits
+        semester_totals[semester_id][1] += _grade_point(Decimal(str(marks))) * credits
+
+    student_totals = defaultdict(lambda: [Decimal(0), Decimal(0)])
+    owners = dict(bind.execute(sa.select(semesters.c.id, semesters.c.student_id)).all())
+    for semester_id, (credits, points) in semester_totals.items():
+        if credits > 0:
+            gpa = round(float(points) / float(credits), 2)
+            student_totals[owners[semester_id]][0] += credits
+            student_totals[owners[semester_id]][1] += Decimal(str(gpa)) * credits
+
+    update_semester = semesters.update().where(semesters.c.id == sa.bindparam('row_id')).values(
+        total_credits=sa.bindparam('credits'), weighted_points=sa.bindparam('points'))
+    update_student = students.update().where(students.c.id == sa.bindparam('row_id')).values(
+        total_credits=sa.bindparam('credits'), weighted_points=sa.bindparam('points'))
+
+    if semester_totals:
+        bind.execute(update_semester, [
+            {'row_id': row_id, 'credits': credits, 'points': points}
+            for row_id, (credits, points) in semester_totals.items()
+        ])
+    if student_totals:
+        bind.execute(update_student, [
+            {'row_id': row_id, 'credits': credits, 'points': points}
+            for row_id, (credits, points) in student_totals.items()
+        ])
+
+
+def downgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('weighted_points')
+        batch_op.drop_column('total_credits')
+
+    with op.batch_alter_table('semesters', schema=None) as batch_op:
+        batch_op.drop_column('weighted_points')
+        batch_op.drop_column('total_credits')
@@ -0,0 +1,26 @@
+"""Student data_version for GPA cache invalidation
+
+Revision ID: 9a4c2e61d0b8
+Revises: 3f1b9d2e7a41
+Create Date: 2026-10-18 11:40:05.117630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4c2e61d0b8'
+down_revision = '3f1b9d2e7a41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('data_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_column('data_version')
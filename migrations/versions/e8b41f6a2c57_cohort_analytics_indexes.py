@@ -0,0 +1,32 @@
+"""Indexes for cohort analytics
+
+Revision ID: e8b41f6a2c57
+Revises: d27f5c9e3b16
+Create Date: 2026-10-18 16:21:09.554310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8b41f6a2c57'
+down_revision = 'd27f5c9e3b16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.create_index('ix_students_user_program_year', ['user_id', 'program', 'year'], unique=False)
+
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_courses_subject_area'), ['subject_area'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('courses', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_courses_subject_area'))
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_index('ix_students_user_program_year')
@@ -0,0 +1,121 @@
+"""Student GPA summary table and dashboard index
+
+Revision ID: f3c9a1d7b284
+Revises: e8b41f6a2c57
+Create Date: 2026-10-18 17:08:42.716093
+
+"""
+from collections import defaultdict
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9a1d7b284'
+down_revision = 'e8b41f6a2c57'
+branch_labels = None
+depends_on = None
+
+
+def _gpa(credits, points):
+    # Same rounding as app.utils.gpa_from_totals
+    credits, points = float(credits or 0), float(points or 0)
+    return round(points / credits, 2) if credits else 0.0
+
+
+def upgrade():
+    op.create_table('student_gpa_summary',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('student_id', sa.Integer(), nullable=False),
+    sa.Column('semester_id', sa.Integer(), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_credits', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('weighted_points', sa.Numeric(precision=14, scale=4), nullable=False),
+    sa.Column('gpa', sa.Numeric(precision=5, scale=2), nullable=False),
+    sa.Column('semester_count', sa.Integer(), nullable=True),
+    sa.Column('course_count', sa.Integer(), nullable=False),
+    sa.Column('data_version', sa.Integer(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['semester_id'], ['semesters.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['student_id'], ['students.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('semester_id')
+    )
+    with op.batch_alter_table('student_gpa_summary', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_student_gpa_summary_student_id'), ['student_id'], unique=False)
+        batch_op.create_index('ix_student_gpa_summary_user_refreshed', ['user_id', 'refreshed_at'], unique=False)
+        batch_op.create_index('uq_student_gpa_summary_student', ['student_id'], unique=True,
+                              postgresql_where=sa.text('semester_id IS NULL'),
+                              sqlite_where=sa.text('semester_id IS NULL'))
+
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.create_index('ix_students_user_name', ['user_id', 'name'], unique=False)
+
+    # Backfill from the stored totals so dashboards have rows right after the
+    # upgrade; the app's refresher keeps them current from then on
+    bind = op.get_bind()
+    students = sa.table('students',
+        sa.column('id', sa.Integer), sa.column('user_id', sa.Integer),
+        sa.column('total_credits', sa.Numeric), sa.column('weighted_points', sa.Numeric),
+        sa.column('data_version', sa.Integer))
+    semesters = sa.table('semesters',
+        sa.column('id', sa.Integer), sa.column('student_id', sa.Integer),
+        sa.column('total_credits', sa.Numeric), sa.column('weighted_points', sa.Numeric))
+    courses = sa.table('courses', sa.column('id', sa.Integer), sa.column('semester_id', sa.Integer))
+    summary = sa.table('student_gpa_summary',
+        sa.column('student_id', sa.Integer), sa.column('semester_id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('total_credits', sa.Numeric), sa.column('weighted_points', sa.Numeric),
+        sa.column('gpa', sa.Numeric), sa.column('semester_count', sa.Integer),
+        sa.column('course_count', sa.Integer), sa.column('data_version', sa.Integer),
+        sa.column('refreshed_at', sa.DateTime))
+
+    now = datetime.utcnow()
+    owners = {student_id: (user_id, version or 0) for student_id, user_id, version in
+              bind.execute(sa.select(students.c.id, students.c.user_id, students.c.data_version))}
+    course_counts = dict(bind.execute(
+        sa.select(courses.c.semester_id, sa.func.count(courses.c.id)).group_by(courses.c.semester_id)).all())
+
+    rows = []
+    counts = defaultdict(lambda: [0, 0])
+    for semester_id, student_id, credits, points in bind.execute(
+            sa.select(semesters.c.id, semesters.c.student_id,
+                      semesters.c.total_credits, semesters.c.weighted_points)):
+        if student_id not in owners:
+            continue
+        user_id, version = owners[student_id]
+        course_count = course_counts.get(semester_id, 0)
+        counts[student_id][0] += 1
+        counts[student_id][1] += course_count
+        rows.append({'student_id': student_id, 'semester_id': semester_id, 'user_id': user_id,
+                     'total_credits': credits, 'weighted_points': points, 'gpa': _gpa(credits, points),
+                     'semester_count': None, 'course_count': course_count,
+                     'data_version': version, 'refreshed_at': now})
+
+    for student_id, credits, points in bind.execute(
+            sa.select(students.c.id, students.c.total_credits, students.c.weighted_points)):
+        user_id, version = owners[student_id]
+        semester_count, course_count = counts[student_id]
+        rows.append({'student_id': student_id, 'semester_id': None, 'user_id': user_id,
+                     'total_credits': credits, 'weighted_points': points, 'gpa': _gpa(credits, points),
+                     'semester_count': semester_count, 'course_count': course_count,
+                     'data_version': version, 'refreshed_at': now})
+
+    if rows:
+        bind.execute(summary.insert(), rows)
+
+
+def downgrade():
+    with op.batch_alter_table('students', schema=None) as batch_op:
+        batch_op.drop_index('ix_students_user_name')
+
+    with op.batch_alter_table('student_gpa_summary', schema=None) as batch_op:
+        batch_op.drop_index('uq_student_gpa_summary_student',
+                            postgresql_where=sa.text('semester_id IS NULL'),
+                            sqlite_where=sa.text('semester_id IS NULL'))
+        batch_op.drop_index('ix_student_gpa_summary_user_refreshed')
+        batch_op.drop_index(batch_op.f('ix_student_gpa_summary_student_id'))
+
+    op.drop_table('student_gpa_summary')
@@ -0,0 +1,102 @@
+"""Pin the number of SQL statements behind the student, semester and course pages.
+
+Each page is requested with cold caches, so the counts cover the queries a
+page makes on its own. A change that adds a query per semester or course
+(an N+1) fails here instead of showing up as a slow page.
+"""
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+os.environ['JOB_WORKERS'] = '0'
+os.environ['GPA_SUMMARY_REFRESH_INTERVAL'] = '0'
+
+import pytest
+from sqlalchemy import event
+from app import create_app
+from app.cache import gpa_cache, user_cache
+from app.fragments import fragment_cache
+from app.models import db, User, Student, Semester, Course
+
+SEMESTERS = 8
+COURSES_PER_SEMESTER = 10
+
+
+@pytest.fixture(scope='module')
+def app():
+    app = create_app()
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        db.create_all()
+        user = User(username='counter', email='counter@example.com')
+        user.set_password('password')
+        db.session.add(user)
+        db.session.flush()
+        student = Student(user_id=user.id, name='Student', student_id='QC1')
+        db.session.add(student)
+        db.session.flush()
+        for number in range(1, SEMESTERS + 1):
+            semester = Semester(student_id=student.id, name=f'Semester {number}', semester_number=number)
+            db.session.add(semester)
+            db.session.flush()
+            for index in range(COURSES_PER_SEMESTER):
+                db.session.add(Course(semester_id=semester.id, course_name=f'Course {index}',
+                                      credits=3, marks=50 + index * 5))
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.post('/auth/login', data={'username': 'counter', 'password': 'password'})
+    return client
+
+
+@pytest.fixture
+def statements(app):
+    executed = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count)
+    yield executed
+    event.remove(engine, 'before_cursor_execute', count)
+
+
+def get(client, statements, url):
+    """Statements executed for one GET of url, with every cache cleared first"""
+    gpa_cache.store.clear()
+    user_cache.local.clear()
+    fragment_cache.local.clear()
+    statements.clear()
+    response = client.get(url)
+    assert response.status_code == 200, url
+    return len(statements)
+
+
+def ids(app):
+    with app.app_context():
+        semester = Semester.query.order_by(Semester.id).first()
+        course = Course.query.filter_by(semester_id=semester.id).order_by(Course.id).first()
+        return semester.student_id, semester.id, course.id
+
+
+def test_view_student(app, client, statements):
+    student_id, _, _ = ids(app)
+    # user, student, its semesters, course counts of all semesters in one grouped query
+    assert get(client, statements, f'/students/{student_id}') == 4
+
+
+def test_view_semester(app, client, statements):
+    _, semester_id, _ = ids(app)
+    # user, semester with its student, its courses
+    assert get(client, statements, f'/semesters/{semester_id}') == 3
+
+
+def test_edit_course(app, client, statements):
+    _, _, course_id = ids(app)
+    # user, course joined through its semester and student
+    assert get(client, statements, f'/courses/{course_id}/edit') == 2